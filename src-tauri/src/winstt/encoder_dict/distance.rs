@@ -0,0 +1,169 @@
+//! Thresholded Levenshtein distance for the retrieval prefilter.
+//!
+//! The phonetic gate never needs the full distance of a far pair. "Is `edit / max_len` under
+//! [`super::index::EDIT_RATIO_MAX`]" is "is the distance at most k" for a small k, yet a full DP table
+//! costs as much for "video" vs "kubernetes" as for a real near miss, for every window × candidate
+//! term of every utterance. [`levenshtein_within`] answers the bounded question exactly:
+//!
+//!   * words of at most 64 chars (every realistic window / term) use Myers / Hyyrö bit-parallel DP:
+//!     one u64 pair holds a whole column, a dozen integer ops per char of the other word, and the
+//!     running score bounds the final distance from below, so hopeless pairs stop early;
+//!   * longer input falls back to a banded DP (only the 2k + 1 diagonals that can stay within k),
+//!     stopping as soon as a whole row exceeds k.
+//!
+//! Mirrors `tools/bench/edit_distance.py`, where `bench_edit_distance.py` times both against the full
+//! table on STT word pairs.
+
+/// Exact Levenshtein distance of `a` and `b` (in chars) if it is at most `max`, else `None`.
+pub(super) fn levenshtein_within(a: &str, b: &str, max: usize) -> Option<usize> {
+    let a: Vec<char> = a.chars().collect();
+    let b: Vec<char> = b.chars().collect();
+    let (short, long) = if a.len() <= b.len() {
+        (&a, &b)
+    } else {
+        (&b, &a)
+    };
+    if long.len() - short.len() > max {
+        return None;
+    }
+    if short.is_empty() {
+        return Some(long.len());
+    }
+    if short == long {
+        return Some(0);
+    }
+    if short.len() <= 64 {
+        myers(short, long, max)
+    } else {
+        banded(short, long, max)
+    }
+}
+
+/// Bit-parallel DP with `pattern` (1..=64 chars) along the bit vectors.
+fn myers(pattern: &[char], text: &[char], max: usize) -> Option<usize> {
+    let m = pattern.len();
+    // Match masks per distinct pattern char; a linear scan beats hashing at these sizes.
+    let mut peq: Vec<(char, u64)> = Vec::with_capacity(m);
+    for (i, &c) in pattern.iter().enumerate() {
+        match peq.iter_mut().find(|(k, _)| *k == c) {
+            Some((_, bits)) => *bits |= 1 << i,
+            None => peq.push((c, 1 << i)),
+        }
+    }
+    let full = if m == 64 { u64::MAX } else { (1u64 << m) - 1 };
+    let top = 1u64 << (m - 1);
+    let (mut pv, mut mv, mut score) = (full, 0u64, m);
+    let n = text.len();
+    for (j, c) in text.iter().enumerate() {
+        let eq = peq
+            .iter()
+            .find(|(k, _)| k == c)
+            .map_or(0, |(_, bits)| *bits);
+        let xv = eq | mv;
+        let xh = ((eq & pv).wrapping_add(pv) ^ pv) | eq;
+        let mut ph = mv | !(xh | pv);
+        let mut mh = pv & xh;
+        if ph & top != 0 {
+            score += 1;
+        } else if mh & top != 0 {
+            score -= 1;
+        }
+        // The last row can only fall by one per remaining column.
+        if score > max + (n - 1 - j) {
+            return None;
+        }
+        ph = ((ph << 1) | 1) & full;
+        mh = (mh << 1) & full;
+        pv = (mh | !(xv | ph)) & full;
+        mv = ph & xv;
+    }
+    (score <= max).then_some(score)
+}
+
+/// Banded DP for words too long for one machine word.
+fn banded(a: &[char], b: &[char], max: usize) -> Option<usize> {
+    let (m, n) = (a.len(), b.len());
+    let over = max + 1;
+    let mut prev: Vec<usize> = (0..=n).map(|j| j.min(over)).collect();
+    let mut cur = vec![over; n + 1];
+    for i in 1..=m {
+        let (lo, hi) = (i.saturating_sub(max).max(1), (i + max).min(n));
+        cur.fill(over);
+        cur[0] = i.min(over);
+        let mut best = cur[0];
+        for j in lo..=hi {
+            let v = (prev[j - 1] + usize::from(a[i - 1] != b[j - 1]))
+                .min(prev[j] + 1)
+                .min(cur[j - 1] + 1)
+                .min(over);
+            cur[j] = v;
+            best = best.min(v);
+        }
+        if best > max {
+            return None;
+        }
+        std::mem::swap(&mut prev, &mut cur);
+    }
+    (prev[n] <= max).then_some(prev[n])
+}
+
+#[cfg(test)]
+mod tests {
+    use super::*;
+
+    fn full(a: &str, b: &str) -> usize {
+        strsim::levenshtein(a, b)
+    }
+
+    #[test]
+    fn matches_full_levenshtein_within_the_bound() {
+        let words = [
+            "",
+            "a",
+            "vite",
+            "veet",
+            "video",
+            "vight",
+            "ollama",
+            "ohllama",
+            "kubernetes",
+            "kubernetties",
+            "cooperneties",
+            "supabase",
+            "superbase",
+            "vidéo",
+            "كوبرنيتس",
+            "كوبرنيتيس",
+        ];
+        for a in words {
+            for b in words {
+                let d = full(a, b);
+                for max in 0..6 {
+                    assert_eq!(
+                        levenshtein_within(a, b, max),
+                        (d <= max).then_some(d),
+                        "{a:?} vs {b:?} max {max}"
+                    );
+                }
+            }
+        }
+    }
+
+    #[test]
+    fn long_words_use_the_banded_path() {
+        let a = "x".repeat(100);
+        let mut b = a.clone();
+        b.replace_range(50..51, "y");
+        assert_eq!(levenshtein_within(&a, &b, 2), Some(1));
+        assert_eq!(levenshtein_within(&a, &"y".repeat(100), 5), None);
+        let c = "ab".repeat(40);
+        assert_eq!(levenshtein_within(&c, &c[1..], 3), Some(1));
+    }
+
+    #[test]
+    fn sixty_four_char_pattern_fills_the_word() {
+        let a = "abcd".repeat(16);
+        let b = format!("{}z", &a[..63]);
+        assert_eq!(levenshtein_within(&a, &b, 3), Some(full(&a, &b)));
+    }
+}
@@ -34,7 +34,7 @@ use ort::session::{Session, builder::GraphOptimizationLevel};
 use ort::value::Tensor;
 use tokenizers::Tokenizer;
 
-use super::index::{DictIndex, EDIT_RATIO_MAX, edit_ratio, normalize};
+use super::index::{DictIndex, EDIT_RATIO_MAX, edit_ratio_below, normalize};
 
 /// Default rank threshold: the original span's mean token rank must exceed this to be considered a
 /// mis-hearing. Tuned on the held-out eval for mmBERT-base int8; higher = more conservative.
@@ -194,7 +194,7 @@ impl EncoderDict {
         // edit, or a metaphone homophone — never wildly unrelated. The rank rule then does the
         // semantic work of deciding whether an admitted pair actually warrants a swap.
         let phonetically_close = span_norm == term_norm
-            || edit_ratio(&span_norm, &term_norm) < EDIT_RATIO_MAX
+            || edit_ratio_below(&span_norm, &term_norm, EDIT_RATIO_MAX).is_some()
             || double_metaphone_equal(&span_norm, &term_norm);
         if !phonetically_close {
             return None;
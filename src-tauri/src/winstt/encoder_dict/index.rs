@@ -26,6 +26,7 @@ use std::collections::{HashMap, HashSet};
 
 use strsim::levenshtein;
 
+use super::distance::levenshtein_within;
 use crate::winstt::snippets::phonetic::double_metaphone;
 
 /// How many candidate `(span, term)` pairs survive retrieval and reach the masked-LM judge, at most —
@@ -76,6 +77,15 @@ pub(super) fn edit_ratio(a: &str, b: &str) -> f64 {
     levenshtein(a, b) as f64 / max_len
 }
 
+/// [`edit_ratio`] when it is below `ratio`, else `None` — the gate's question, answered with a
+/// bounded distance that gives up on far pairs instead of filling the full table.
+pub(super) fn edit_ratio_below(a: &str, b: &str, ratio: f64) -> Option<f64> {
+    let max_len = a.chars().count().max(b.chars().count()).max(1);
+    let bound = (ratio * max_len as f64).ceil() as usize;
+    let edit = levenshtein_within(a, b, bound.saturating_sub(1))? as f64 / max_len as f64;
+    (edit < ratio).then_some(edit)
+}
+
 /// Character n-grams (n = [`NGRAM_MIN`]..=[`NGRAM_MAX`]) of a normalized string. For a string shorter
 /// than `NGRAM_MIN`, the whole string is its own single gram so short terms still index.
 fn char_ngrams(norm: &str) -> HashSet<String> {
@@ -234,12 +244,17 @@ impl DictIndex {
                 for id in cand_ids {
                     let term = &self.terms[id];
                     let mp_equal = metaphone_overlap(&win_mp, &term.metaphone);
-                    let edit = edit_ratio(&win_norm, &term.norm);
                     // Tight phonetic gate: homophone (metaphone-equal) OR a close edit. Anything else
-                    // that merely shares an n-gram is dropped BEFORE the model ever sees it.
-                    if !(mp_equal || edit < EDIT_RATIO_MAX) {
-                        continue;
-                    }
+                    // that merely shares an n-gram is dropped BEFORE the model ever sees it. Only a
+                    // homophone needs its exact (possibly large) edit ratio for the tiebreak.
+                    let edit = if mp_equal {
+                        edit_ratio(&win_norm, &term.norm)
+                    } else {
+                        match edit_ratio_below(&win_norm, &term.norm, EDIT_RATIO_MAX) {
+                            Some(edit) => edit,
+                            None => continue,
+                        }
+                    };
                     // Score = n-gram overlap coefficient (|∩| / min set size) + a homophone bonus, so
                     // exact-sound matches rank above merely-similar spellings.
                     let common = win_ngrams.intersection(&term.ngrams).count();
@@ -17,6 +17,7 @@
 //! Validated on the real int8 model (`examples/dict_eval`): 100% recall / 0 false positives on the
 //! adversarial set at 50 terms, ~42 ms/utterance.
 
+mod distance;
 pub mod download;
 pub mod engine;
 pub mod index;
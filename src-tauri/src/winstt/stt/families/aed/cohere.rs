@@ -182,6 +182,25 @@ fn encoder_pad_bucket(
         .then_some(ENC_PAD_BUCKET_SAMPLES)
 }
 
+/// The CPU-EP decoder graph to load instead of the default `decoder`, if any. On the CPU EP, the
+/// growing-self dynamic decoder (`decoder_dyn`) is ~3× faster than the DML-static graph (which
+/// attends over the full fixed KV buffer every token) — pick it when the decoder is CPU-bound and
+/// the export ships one. On DML the static graph wins big. `decoder_cpu` is the same hoisted
+/// dynamic-self layout with the FUSED attention kept (the decomposition only exists for DirectML),
+/// so it is preferred over `decoder_dyn` when shipped. Pure so the choice is unit-testable.
+fn cpu_decoder_file(
+    files: &BTreeMap<String, std::path::PathBuf>,
+    decoder_on_cpu: bool,
+) -> Option<&std::path::Path> {
+    if !decoder_on_cpu {
+        return None;
+    }
+    files
+        .get("decoder_cpu")
+        .or_else(|| files.get("decoder_dyn"))
+        .map(|p| p.as_path())
+}
+
 impl CohereEngine {
     pub fn load(cfg: &EngineConfig) -> SttResult<CohereEngine> {
         // HYBRID device policy on DirectML (measured, 66 s clip, fp32, RTX 3080 Ti):
@@ -223,15 +242,12 @@ impl CohereEngine {
             &cfg.providers
         };
         let decoder_on_cpu = dec_providers.first() == Some(&Accelerator::Cpu);
-        // On the CPU EP, the growing-self dynamic decoder (`decoder_dyn`) is ~3× faster than the
-        // DML-static graph (which attends over the full fixed KV buffer every token) — pick it when
-        // the decoder is CPU-bound and the export ships one. On DML the static graph wins big.
-        let decoder_path = match cfg.resolved.files.get("decoder_dyn") {
-            Some(dyn_path) if decoder_on_cpu => {
+        let decoder_path = match cpu_decoder_file(&cfg.resolved.files, decoder_on_cpu) {
+            Some(dyn_path) => {
                 static_export = false;
-                dyn_path.as_path()
+                dyn_path
             }
-            _ => decoder_path,
+            None => decoder_path,
         };
         let encoder = build_session(file(&cfg.resolved, "encoder")?, enc_providers)?;
         let decoder = build_session(decoder_path, dec_providers)?;
@@ -1053,6 +1069,43 @@ mod tests {
         assert_eq!(encoder_pad_bucket(true, true, true, true), None);
     }
 
+    fn decoder_files(keys: &[&str]) -> BTreeMap<String, std::path::PathBuf> {
+        keys.iter()
+            .map(|k| {
+                (
+                    k.to_string(),
+                    std::path::PathBuf::from(format!("onnx/{k}.onnx")),
+                )
+            })
+            .collect()
+    }
+
+    #[test]
+    fn cpu_decoder_prefers_fused_cpu_graph_over_dyn() {
+        // Both CPU graphs shipped: the fused-attention `decoder_cpu` wins over `decoder_dyn`.
+        let files = decoder_files(&["encoder", "decoder", "decoder_dyn", "decoder_cpu"]);
+        assert_eq!(
+            cpu_decoder_file(&files, true),
+            Some(std::path::Path::new("onnx/decoder_cpu.onnx"))
+        );
+        // Only the decomposed dynamic-self graph: it is the CPU pick.
+        let files = decoder_files(&["encoder", "decoder", "decoder_dyn"]);
+        assert_eq!(
+            cpu_decoder_file(&files, true),
+            Some(std::path::Path::new("onnx/decoder_dyn.onnx"))
+        );
+    }
+
+    #[test]
+    fn cpu_decoder_keeps_default_graph_off_cpu_or_when_absent() {
+        // Decoder on DirectML / CUDA: the static default `decoder` is loaded even if CPU graphs ship.
+        let files = decoder_files(&["encoder", "decoder", "decoder_dyn", "decoder_cpu"]);
+        assert_eq!(cpu_decoder_file(&files, false), None);
+        // Legacy single-decoder export on the CPU EP: nothing to swap in.
+        let files = decoder_files(&["encoder", "decoder"]);
+        assert_eq!(cpu_decoder_file(&files, true), None);
+    }
+
     #[test]
     fn cross_bias_valid_frames_no_pad_keeps_every_frame() {
         // Unpadded utterance (or pad bucket off): every encoder frame is real speech.
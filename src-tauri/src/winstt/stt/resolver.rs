@@ -200,6 +200,56 @@ mod tests {
         assert!(g.iter().any(|f| f.key == "decoder" && !f.optional));
     }
 
+    #[test]
+    fn cohere_cpu_decoder_resolves_when_shipped_encoder_decoder_still_required() {
+        // `decoder_cpu` (the fused-attention CPU decoder) resolves when the export ships it, without
+        // being mistaken for the default decoder; without it the repo still resolves, and encoder +
+        // decoder stay hard requirements.
+        let dir = tempfile::tempdir().unwrap();
+        let onnx = dir.path().join("onnx");
+        std::fs::create_dir_all(&onnx).unwrap();
+        let graphs = [
+            "encoder_model_int8.onnx",
+            "decoder_model_merged_int8.onnx",
+            "decoder_model_merged_int8_dyn.onnx",
+            "decoder_model_merged_int8_cpu.onnx",
+        ];
+        for f in graphs {
+            std::fs::write(onnx.join(f), b"").unwrap();
+        }
+        for f in ["tokenizer.json", "tokenizer_config.json"] {
+            std::fs::write(dir.path().join(f), b"{}").unwrap();
+        }
+        let resolve_dir = || {
+            tokio::runtime::Builder::new_current_thread()
+                .build()
+                .unwrap()
+                .block_on(resolve(&ResolveRequest {
+                    model_id: "cohere-transcribe-arabic".into(),
+                    kind: EngineKind::CohereAsr,
+                    effective_quant: Quantization::Int8,
+                    local_dir: Some(dir.path().to_path_buf()),
+                    local_files_only: true,
+                }))
+        };
+
+        let r = resolve_dir().expect("full Cohere export resolves");
+        assert_eq!(r.files["decoder_cpu"], onnx.join(graphs[3]));
+        assert_eq!(r.files["decoder"], onnx.join(graphs[1]));
+        assert_eq!(r.files["decoder_dyn"], onnx.join(graphs[2]));
+
+        std::fs::remove_file(onnx.join(graphs[3])).unwrap();
+        let r = resolve_dir().expect("export without decoder_cpu still resolves");
+        assert!(!r.files.contains_key("decoder_cpu"));
+        assert_eq!(r.files["decoder"], onnx.join(graphs[1]));
+
+        for required in [graphs[0], graphs[1]] {
+            std::fs::remove_file(onnx.join(required)).unwrap();
+            assert!(resolve_dir().is_err(), "{required} must stay required");
+            std::fs::write(onnx.join(required), b"").unwrap();
+        }
+    }
+
     #[test]
     fn quant_suffix_uses_question_separator() {
         assert_eq!(quant_suffix(Quantization::Default), "");
@@ -329,6 +329,12 @@ pub fn file_globs(model_id: &str, kind: EngineKind, quant: Quantization) -> Vec<
                 "decoder_dyn",
                 format!("**/decoder_model_merged{s}_dyn.onnx"),
             ),
+            // Same CPU role, fused contrib attention kept (`cohere_decompose_attention.py` emits it
+            // for exports that have it). Optional: preferred over `decoder_dyn` when present.
+            go(
+                "decoder_cpu",
+                format!("**/decoder_model_merged{s}_cpu.onnx"),
+            ),
             g("tokenizer", "tokenizer.json".into()),
             g("tokenizer_config", "tokenizer_config.json".into()),
         ],
@@ -0,0 +1,83 @@
+#!/usr/bin/env python3
+"""Micro-benchmark of the prefilter's edit-distance test on realistic STT word pairs: the full-table
+`lev` the evals used vs the thresholded `edit_distance` variants, all answering "lev / max(len) < 0.34,
+and the distance if so". Every variant must agree with `lev` on every pair.
+
+Pairs are what the prefilter actually sees. Every 1-2 word window of the benchmark utterances is
+paired with every term of the eval DICT, so most pairs are far apart. On top of those come the
+known mis-hearings ("veet"/"vite", "cooper netties"/"kubernetes", ...), which are the close ones.
+
+  python tools/bench/bench_edit_distance.py [--repeats 5]
+"""
+import argparse
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+from bench_vocab_index import DICT, UTTERANCES  # noqa: E402
+from edit_distance import lev_banded, lev_myers, lev_ratio_below, ratio_bound  # noqa: E402
+from vocab_index import EDIT_RATIO_MAX, WORD_RE, lev, term_norm  # noqa: E402
+
+MISHEARINGS = [("veet", "vite"), ("vight", "vite"), ("video", "vite"), ("ohllama", "ollama"),
+               ("olama", "ollama"), ("kubernetties", "kubernetes"), ("cooperneties", "kubernetes"),
+               ("chargebe", "chargebee"), ("superbase", "supabase"), ("pietorch", "pytorch"),
+               ("reddis", "redis"), ("redis", "redis"), ("graphana", "grafana"), ("figmah", "figma"),
+               ("possgres", "postgres"), ("talewind", "tailwind"), ("tailwind", "tailwind")]
+
+
+def stt_pairs():
+    terms = [term_norm(t) for t in DICT]
+    pairs = []
+    for u in UTTERANCES:
+        words = [m.group(0).lower() for m in WORD_RE.finditer(u)]
+        for w in words + [a + b for a, b in zip(words, words[1:])]:
+            pairs += [(w, t) for t in terms]
+    return pairs + MISHEARINGS
+
+
+def full_table(a, b):
+    d = lev(a, b)
+    return d if d / max(len(a), len(b), 1) < EDIT_RATIO_MAX else None
+
+
+def thresholded(fn):
+    def test(a, b):
+        k = ratio_bound(a, b, EDIT_RATIO_MAX)
+        d = fn(a, b, k) if k >= 0 else None
+        return d if d is not None and d / max(len(a), len(b), 1) < EDIT_RATIO_MAX else None
+    return test
+
+
+VARIANTS = [("lev (full table)", full_table), ("lev_banded", thresholded(lev_banded)),
+            ("lev_myers", thresholded(lev_myers)),
+            ("lev_ratio_below", lambda a, b: lev_ratio_below(a, b, EDIT_RATIO_MAX))]
+
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--repeats", type=int, default=5, help="best-of repeats per timing (default 5)")
+    args = ap.parse_args()
+    pairs = stt_pairs()
+    want = [full_table(a, b) for a, b in pairs]
+    close = sum(d is not None for d in want)
+    print(f"{len(pairs)} window/term pairs ({close} within ratio {EDIT_RATIO_MAX}), best of {args.repeats}")
+    base = None
+    for name, fn in VARIANTS:
+        got = [fn(a, b) for a, b in pairs]
+        if got != want:
+            bad = next((p, g, w) for p, g, w in zip(pairs, got, want) if g != w)
+            raise SystemExit(f"{name} disagrees with lev on {bad[0]}: {bad[1]} != {bad[2]}")
+        best = float("inf")
+        for _ in range(args.repeats):
+            t0 = time.perf_counter()
+            for a, b in pairs:
+                fn(a, b)
+            best = min(best, time.perf_counter() - t0)
+        us = best / len(pairs) * 1e6
+        base = base or us
+        print(f"  {name:<18} {us:>7.2f} µs/pair  {base / us:>5.1f}x")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,109 @@
+#!/usr/bin/env python3
+"""Per-utterance cost of phonetic candidate generation as the dictionary grows: the `VocabIndex`
+(soundex buckets + a length-banded edit index, built once) vs the old every-term scan. The scan grows
+linearly with the dictionary. The index cost should track only `cands/utt`, the candidates it
+returns, which rise as more terms collide phonetically with the utterance's words. Wherever the
+scan runs, its candidates must equal the index's (same tuples, same order).
+
+Dictionaries are the 12-term eval DICT padded with deterministic pseudo brand / jargon terms
+(pronounceable onset-vowel-coda compounds, some camel-cased or two-word), so soundex buckets and
+edit neighbourhoods look like a real user's list rather than random strings.
+
+  python tools/bench/bench_vocab_index.py [--sizes 12,100,1000,10000] [--scan-max 1000] [--repeats 3]
+"""
+import argparse
+import os
+import random
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+from vocab_index import VocabIndex, scan_vocab_candidates  # noqa: E402
+
+DICT = ["Vite", "ollama", "kubernetes", "ChargeBee", "Supabase", "PyTorch",
+        "Redis", "Grafana", "Figma", "Kafka", "Postgres", "Tailwind"]
+UTTERANCES = [
+    "I switched the project from webpack to veet for faster builds.",
+    "we migrated the project to cooper netties last month.",
+    "the team deployed supa base in production yesterday.",
+    "have you configured red iss for the new service?",
+    "I watched a long video about cooking last night.",
+    "the plane landed early thanks to a strong tail wind.",
+    "nous avons migré le projet vers graph ana le mois dernier.",
+    "wir haben das Projekt letzten Monat auf post gres migriert.",
+    "please send me the report by Friday afternoon and ping me on slack.",
+    "I ran the model locally with oh llama and pie torch last night.",
+]
+ONSETS = ["", "b", "br", "c", "ch", "cl", "d", "dr", "f", "fl", "g", "gr", "h", "j", "k", "kr", "l", "m", "n",
+          "p", "pl", "pr", "qu", "r", "s", "sh", "sk", "sp", "st", "t", "th", "tr", "v", "w", "x", "y", "z"]
+VOWELS = ["a", "e", "i", "o", "u", "y", "ai", "ea", "ee", "io", "oo", "ou"]
+CODAS = ["", "", "", "b", "ck", "d", "g", "k", "l", "m", "n", "nd", "ng", "nt", "p", "r", "rk", "s", "st", "t", "x", "z"]
+
+
+def syllable(rng):
+    return rng.choice(ONSETS) + rng.choice(VOWELS) + rng.choice(CODAS)
+
+
+def pseudo_terms(count, seed=0):
+    rng = random.Random(seed)
+    out, seen = [], set(t.lower() for t in DICT)
+    while len(out) < count:
+        term = "".join(syllable(rng) for _ in range(rng.randint(1, 3)))
+        style = rng.random()
+        if len(term) < 3:
+            continue
+        if style < 0.3:
+            term = term.capitalize()
+        elif style < 0.4:
+            cut = rng.randint(1, len(term) - 1)
+            term = term[:cut].capitalize() + term[cut:].capitalize()
+        elif style < 0.45:
+            term = f"{term} {syllable(rng)}"
+        if term.lower() not in seen:
+            seen.add(term.lower())
+            out.append(term)
+    return out
+
+
+def per_utterance_ms(fn, repeats):
+    best = float("inf")
+    for _ in range(repeats):
+        t0 = time.perf_counter()
+        for u in UTTERANCES:
+            fn(u)
+        best = min(best, (time.perf_counter() - t0) / len(UTTERANCES) * 1000)
+    return best
+
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--sizes", default="12,100,1000,10000", help="dictionary sizes (default 12,100,1000,10000)")
+    ap.add_argument("--scan-max", type=int, default=1000,
+                    help="largest dictionary the per-term scan is timed on (default 1000)")
+    ap.add_argument("--repeats", type=int, default=3, help="best-of repeats per timing (default 3)")
+    args = ap.parse_args()
+    sizes = [int(s) for s in args.sizes.split(",") if s.strip()]
+    extra = pseudo_terms(max(sizes) - len(DICT)) if max(sizes) > len(DICT) else []
+
+    print(f"{len(UTTERANCES)} utterances, best of {args.repeats}\n"
+          f"{'terms':>6} {'build ms':>9} {'index ms/utt':>13} {'scan ms/utt':>12} {'speedup':>8} {'cands/utt':>10}")
+    for size in sizes:
+        vocab = (DICT + extra)[:size]
+        t0 = time.perf_counter()
+        index = VocabIndex(vocab)
+        build = (time.perf_counter() - t0) * 1000
+        idx_ms = per_utterance_ms(index.candidates, args.repeats)
+        cands = sum(len(index.candidates(u)) for u in UTTERANCES) / len(UTTERANCES)
+        scan = "-"
+        speed = "-"
+        if size <= args.scan_max:
+            for u in UTTERANCES:
+                if index.candidates(u) != scan_vocab_candidates(u, vocab):
+                    raise SystemExit(f"index / scan candidates differ at {size} terms on: {u}")
+            scan_ms = per_utterance_ms(lambda u: scan_vocab_candidates(u, vocab), args.repeats)
+            scan, speed = f"{scan_ms:.2f}", f"{scan_ms / idx_ms:.1f}x"
+        print(f"{size:>6} {build:>9.1f} {idx_ms:>13.2f} {scan:>12} {speed:>8} {cands:>10.1f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,104 @@
+#!/usr/bin/env python3
+"""Thresholded Levenshtein distance for the dictionary prefilter (the eval scripts here and the Rust
+`encoder_dict::distance` they model).
+
+The prefilter never needs the full distance of a far pair. It asks whether lev(a, b) / max(len) is
+under 0.34, and that is "is the distance at most k" for a small k. The full O(m·n) table of `lev`
+pays the same for "video"/"kubernetes" as for a real near miss, on every window × term pair of every
+dictated utterance. Three exact variants:
+
+  * `lev_banded(a, b, k)`: only the 2k + 1 diagonals around the main one can stay within k, so each
+    row fills at most 2k + 1 cells, and the scan stops as soon as a whole row exceeds k;
+  * `lev_myers(a, b, k=None)`: Myers / Hyyrö bit-parallel DP. One column of the table is a pair of
+    bit vectors over the shorter word, advanced by a dozen integer ops per character of the other
+    word. The running score gives a lower bound, so it too can stop early. Python ints are unbounded,
+    but the Rust port keeps it to words of at most 64 chars (one u64);
+  * `lev_within(a, b, k)`: the one to call. It rejects on the length difference, then runs Myers.
+
+Each returns the exact distance when it is <= k and `None` otherwise, so a caller that also
+needs the value of a close pair (the candidate sort key) gets it for free.
+`bench_edit_distance.py` checks them against `vocab_index.lev` and times them on STT word pairs.
+"""
+import math
+
+
+def lev_banded(a: str, b: str, k: int):
+    m, n = len(a), len(b)
+    if abs(m - n) > k:
+        return None
+    if not m or not n:
+        return max(m, n)
+    big = k + 1
+    prev = [j if j <= k else big for j in range(n + 1)]
+    for i in range(1, m + 1):
+        lo, hi = max(1, i - k), min(n, i + k)
+        cur = [big] * (n + 1)
+        cur[0] = i if i <= k else big
+        best = cur[0]
+        ai = a[i - 1]
+        for j in range(lo, hi + 1):
+            v = prev[j - 1] + (ai != b[j - 1])
+            if prev[j] + 1 < v:
+                v = prev[j] + 1
+            if cur[j - 1] + 1 < v:
+                v = cur[j - 1] + 1
+            cur[j] = v if v <= k else big
+            if v < best:
+                best = v
+        if best > k:
+            return None
+        prev = cur
+    return prev[n] if prev[n] <= k else None
+
+
+def lev_myers(a: str, b: str, k=None):
+    """Exact distance via bit-parallel DP over the shorter word (None when above `k`, if given)."""
+    if len(a) > len(b):
+        a, b = b, a
+    m, n = len(a), len(b)
+    if not m:
+        return n if k is None or n <= k else None
+    peq = {}
+    for i, c in enumerate(a):
+        peq[c] = peq.get(c, 0) | (1 << i)
+    full = (1 << m) - 1
+    top = 1 << (m - 1)
+    pv, mv, score = full, 0, m
+    for j, c in enumerate(b):
+        eq = peq.get(c, 0)
+        xv = eq | mv
+        xh = (((eq & pv) + pv) ^ pv) | eq
+        ph = mv | (~(xh | pv) & full)
+        mh = pv & xh
+        if ph & top:
+            score += 1
+        elif mh & top:
+            score -= 1
+        if k is not None and score - (n - 1 - j) > k:  # the last row can fall by 1 per column left
+            return None
+        ph = ((ph << 1) | 1) & full
+        mh = (mh << 1) & full
+        pv = mh | (~(xv | ph) & full)
+        mv = ph & xv
+    return score if k is None or score <= k else None
+
+
+def lev_within(a: str, b: str, k: int):
+    """lev(a, b) if it is <= k, else None."""
+    if abs(len(a) - len(b)) > k:
+        return None
+    if a == b:
+        return 0
+    return lev_myers(a, b, k)
+
+
+def ratio_bound(a: str, b: str, ratio: float) -> int:
+    """Largest distance d with d / max(len) < ratio (-1 if none)."""
+    return math.ceil(ratio * max(len(a), len(b), 1)) - 1
+
+
+def lev_ratio_below(a: str, b: str, ratio: float):
+    """lev(a, b) if lev / max(len) < ratio, else None: the exact prefilter test, thresholded."""
+    k = ratio_bound(a, b, ratio)
+    d = lev_within(a, b, k) if k >= 0 else None
+    return d if d is not None and d / max(len(a), len(b), 1) < ratio else None
@@ -11,22 +11,40 @@ Approach under test (deterministic, no generative LLM):
      fit (not the rare brand's absolute prob) is what sidesteps the out-of-vocab problem.
   3. Replacement PAIRS are deterministic whole-word find->replace (unambiguous; no LM needed).
 
+Candidate generation (soundex / edit prefilter) lives in `vocab_index.py`, indexed once per dictionary.
+Each utterance is tokenized once (`TOKENS`) and its candidate ranks computed once per model, then
+every rank K is swept over them. Latency is reported split into tokenizer and model time, and the cap
+is judged on a live pass's cost: tokenization served from the cache is charged back at its cold cost.
+
 Picks the most accurate model whose per-utterance latency stays under the cap.
 
   python tools/bench/eval_encoder_dict.py
 """
+import os
 import re
+import sys
 import time
 
+import numpy as np
 import torch
 from transformers import AutoModelForMaskedLM, AutoTokenizer
 
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+from vocab_index import gen_vocab_candidates  # noqa: E402
+
 LATENCY_CAP_MS = 300.0
 MODELS = ["jhu-clsp/mmBERT-small", "jhu-clsp/mmBERT-base", "FacebookAI/xlm-roberta-base"]
 # Rank rule: replace the original span with its phonetic candidate when the original word is
 # contextually UNEXPECTED — its mean token rank among the MLM's predictions for that slot exceeds
 # RANK_K. Rank is scale-free (no per-language log-prob calibration) and never scores the OOV term.
 RANK_KS = [5, 10, 20, 30, 50, 75, 100, 200, 400]
+# Masked rows per model forward. The masked rows of every candidate span of an utterance (or a queue of
+# utterances) are batched together, cut into chunks of at most this many rows, fewer when their float32
+# logits would exceed LOGITS_BUDGET_BYTES: a full (R, L, V) output at mmBERT's ~256k vocabulary is ~1 MB
+# per token, so a chunk of ~25-token rows holds only ~10 of them, and an utterance with more masked
+# tokens takes several forwards. A masked-position head's (R, V) output keeps the full row cap.
+MAX_BATCH_ROWS = 64
+LOGITS_BUDGET_BYTES = 256 * 2**20
 
 CASES = [
     dict(text="I watched a video this morning before the meeting.",
@@ -57,93 +75,152 @@ CASES = [
          vocab=["Vite"], pairs=[], contains=["Vite"], absent=[]),
 ]
 
-WORD_RE = re.compile(r"[A-Za-z0-9À-ɏЀ-ӿ؀-ۿ]+")
-
-
-def soundex(s: str) -> str:
-    s = "".join(c for c in s.lower() if c.isalpha())
-    if not s:
-        return ""
-    codes = {**dict.fromkeys("bfpv", "1"), **dict.fromkeys("cgjkqsxz", "2"),
-             **dict.fromkeys("dt", "3"), "l": "4", **dict.fromkeys("mn", "5"), "r": "6"}
-    out = s[0].upper()
-    prev = codes.get(s[0], "")
-    for ch in s[1:]:
-        c = codes.get(ch, "")
-        if c and c != prev:
-            out += c
-        if ch not in "hw":
-            prev = c
-    return (out + "000")[:4]
-
-
-def lev(a: str, b: str) -> int:
-    m, n = len(a), len(b)
-    if not m:
-        return n
-    if not n:
-        return m
-    prev = list(range(n + 1))
-    for i in range(1, m + 1):
-        cur = [i] + [0] * n
-        for j in range(1, n + 1):
-            cur[j] = min(prev[j] + 1, cur[j - 1] + 1, prev[j - 1] + (a[i - 1] != b[j - 1]))
-        prev = cur
-    return prev[n]
-
-
-def phonetic_close(a: str, b: str) -> bool:
-    a, b = a.lower(), b.lower()
-    if a == b:
-        return True
-    if soundex(a) and soundex(a) == soundex(b):
-        return True
-    # Edit-only matches (different soundex) must be MUCH closer — 0.5 let garbage through
-    # ("please"~"supabase", "mute"~"vite" both 0.50). Genuine corruptions are well under 0.34;
-    # real phonetic collisions (video/veet/vat ~ Vite) come in via the soundex branch above.
-    return lev(a, b) / max(len(a), len(b), 1) < 0.34
-
-
-def gen_vocab_candidates(text, vocab):
-    """Permissive: propose (n_words, start, end, span_text, term) for 1-2 word windows near a term.
-    Longer spans first so "oh llama"->"ollama" beats the 1-word "llama"->"ollama"."""
-    words = [(m.group(0), m.start(), m.end()) for m in WORD_RE.finditer(text)]
-    cands = []
-    for term in vocab:
-        tnorm = "".join(c for c in term.lower() if c.isalnum())
-        for n in (2, 1):
-            for i in range(len(words) - n + 1):
-                span = words[i:i + n]
-                span_norm = "".join(w[0].lower() for w in span)
-                if phonetic_close(span_norm, tnorm):
-                    d = lev(span_norm, tnorm)
-                    cands.append((n, span[0][1], span[-1][2],
-                                  text[span[0][1]:span[-1][2]], term, d))
-    return cands
+
+def tokenizer_key(tok):
+    """Identity of a tokenizer's behaviour, so models sharing one (mmBERT-small / -base) share encodings."""
+    backend = getattr(tok, "backend_tokenizer", None)
+    return hash(backend.to_str()) if backend is not None else (type(tok).__name__, getattr(tok, "name_or_path", None))
+
+
+class TokenCache:
+    """Tokenizer output per (tokenizer, text), computed ONCE and reused by every candidate span, rank-K
+    sweep and model comparison: input ids, attention mask, offsets, and what the encode cost cold."""
+
+    def __init__(self):
+        self.keys = {}  # id(tok) -> (tok, key); holding `tok` keeps its id from being reused
+        self.entries = {}
+
+    def encode(self, tok, text):
+        """(entry, hit): `hit` is True when the text was already encoded, i.e. this call paid nothing."""
+        held = self.keys.get(id(tok))
+        if held is None:
+            held = self.keys[id(tok)] = (tok, tokenizer_key(tok))
+        key = held[1]
+        entry = self.entries.get((key, text))
+        if entry is not None:
+            return entry, True
+        t0 = time.perf_counter()
+        enc = tok(text, return_offsets_mapping=True)
+        entry = self.entries[(key, text)] = dict(
+            ids=list(enc["input_ids"]), attn=list(enc["attention_mask"]),
+            offsets=list(enc["offset_mapping"]), seconds=time.perf_counter() - t0)
+        return entry, False
+
+
+TOKENS = TokenCache()
+# Seconds per stage since the last reset_timing(). "tokenize" is the COLD encode cost of every
+# utterance scored (even when cached), i.e. what a single live pass pays; "model" is forward time;
+# "cached" is the cold encode cost of cache hits, which the measured wall clock did NOT pay.
+TIMING = dict(tokenize=0.0, model=0.0, cached=0.0)
+
+
+def reset_timing():
+    TIMING.update(tokenize=0.0, model=0.0, cached=0.0)
+
+
+def live_ms(wall, n_utts):
+    """Per-utterance latency of a LIVE pass (never pre-tokenized) from a pass that took `wall` seconds:
+    the encodes served from TOKENS are charged back at their cold cost. This is what the cap judges."""
+    return (wall + TIMING["cached"]) / max(n_utts, 1) * 1000
+
+
+def timing_line(n_utts, wall):
+    """The `live_ms` total split into tokenizer, model and the rest (candidate retrieval, padding)."""
+    tok_ms = TIMING["tokenize"] / max(n_utts, 1) * 1000
+    model_ms = TIMING["model"] / max(n_utts, 1) * 1000
+    other_ms = live_ms(wall, n_utts) - tok_ms - model_ms
+    return f"tokenize {tok_ms:.1f} ms + model {model_ms:.0f} ms + other {other_ms:.1f} ms per utterance"
+
+
+def masked_rows(tok, items):
+    """One row per span token of every span of every (text, [(char_start, char_end), ...]) item, each
+    text encoded once via TOKENS: [(item, span, input_ids, attention_mask, masked position)]."""
+    rows = []
+    for k, (text, spans) in enumerate(items):
+        enc, hit = TOKENS.encode(tok, text)
+        TIMING["tokenize"] += enc["seconds"]
+        if hit:
+            TIMING["cached"] += enc["seconds"]
+        for si, (cs, ce) in enumerate(spans):
+            for ti, (s, e) in enumerate(enc["offsets"]):
+                if not (s == 0 and e == 0) and s < ce and e > cs:
+                    rows.append((k, si, enc["ids"], enc["attn"], ti))
+    return rows
+
+
+def pad_rows(tok, rows):
+    """(ids, attention, masked positions, true ids) arrays for a chunk of `masked_rows`, right-padded
+    to its longest text. Rows of one utterance share a length, so they need no padding at all."""
+    width = max(len(r[2]) for r in rows)
+    pad = tok.pad_token_id if tok.pad_token_id is not None else 0
+    ids = np.full((len(rows), width), pad, dtype=np.int64)
+    attn = np.zeros((len(rows), width), dtype=np.int64)
+    pos = np.array([r[4] for r in rows], dtype=np.int64)
+    true = np.array([r[2][r[4]] for r in rows], dtype=np.int64)
+    for j, (_k, _s, row_ids, row_attn, ti) in enumerate(rows):
+        ids[j, :len(row_ids)] = row_ids
+        attn[j, :len(row_attn)] = row_attn
+        ids[j, ti] = tok.mask_token_id
+    return ids, attn, pos, true
+
+
+def row_chunks(rows, vocab, max_rows=MAX_BATCH_ROWS, full_logits=True):
+    """Consecutive chunks of `masked_rows` for one forward each: at most `max_rows` rows, and a logits
+    output (`R*L*V*4` bytes, or `R*V*4` for a masked-position head) within LOGITS_BUDGET_BYTES."""
+    c = 0
+    while c < len(rows):
+        e, width = c + 1, len(rows[c][2])
+        while e < len(rows) and e - c < max_rows:
+            width = max(width, len(rows[e][2]))
+            if (e + 1 - c) * (width if full_logits else 1) * vocab * 4 > LOGITS_BUDGET_BYTES:
+                break
+            e += 1
+        yield rows[c:e]
+        c = e
+
+
+def split_ranks(items, rows, ranks):
+    """Per item, per span: the mean rank of its rows (None for a span that covers no token)."""
+    sums = [[[0, 0] for _ in spans] for _text, spans in items]
+    for (k, si, *_), rk in zip(rows, ranks):
+        sums[k][si][0] += rk
+        sums[k][si][1] += 1
+    return [[t / c if c else None for t, c in item] for item in sums]
 
 
 @torch.no_grad()
+def mean_ranks(model, tok, items, max_rows=MAX_BATCH_ROWS):
+    """Mean rank of the ORIGINAL span tokens among the MLM's predictions for their (masked) slots,
+    for every span of every (text, spans) item. 0 = the model's top choice. High = contextually
+    unexpected. Scale-free; never scores the term. All masked rows of all spans are batched together
+    and cut by `row_chunks` (row cap and logits byte budget), so an utterance's candidates cost as few
+    forwards as that budget allows: one for a few masked tokens, more for many."""
+    rows = masked_rows(tok, items)
+    ranks = []
+    for chunk in row_chunks(rows, model.config.vocab_size, max_rows):
+        ids, attn, pos, true = pad_rows(tok, chunk)
+        t0 = time.perf_counter()
+        logits = model(input_ids=torch.from_numpy(ids), attention_mask=torch.from_numpy(attn)).logits
+        slot = logits[torch.arange(len(pos)), torch.from_numpy(pos)]  # (R, V)
+        # how many tokens outrank the true one
+        ranks += (slot > slot.gather(1, torch.from_numpy(true)[:, None])).sum(1).tolist()
+        TIMING["model"] += time.perf_counter() - t0
+    return split_ranks(items, rows, ranks)
+
+
 def mean_rank(model, tok, text, char_start, char_end):
-    """Mean rank of the ORIGINAL span tokens among the MLM's predictions for their (masked) slots.
-    0 = the model's top choice. High = contextually unexpected. Scale-free; never scores the term."""
-    enc = tok(text, return_tensors="pt", return_offsets_mapping=True)
-    offsets = enc.pop("offset_mapping")[0].tolist()
-    ids = enc["input_ids"][0]
-    span = [i for i, (s, e) in enumerate(offsets)
-            if not (s == 0 and e == 0) and s < char_end and e > char_start]
-    if not span:
-        return None
-    mask_id = tok.mask_token_id
-    batch = ids.unsqueeze(0).repeat(len(span), 1).clone()
-    for r, ti in enumerate(span):
-        batch[r, ti] = mask_id
-    attn = enc["attention_mask"].repeat(len(span), 1)
-    logits = model(input_ids=batch, attention_mask=attn).logits
-    total = 0.0
-    for r, ti in enumerate(span):
-        row = logits[r, ti]
-        total += (row > row[ids[ti]]).sum().item()  # how many tokens outrank the true one
-    return total / len(span)
+    return mean_ranks(model, tok, [(text, [(char_start, char_end)])])[0][0]
+
+
+def pick_spans(cands):
+    """Non-overlapping (cs, ce, term) to score: longer spans, then closest term, win an overlap."""
+    cands = sorted(cands, key=lambda c: (-c[0], c[5]))
+    used = []
+    for _n, cs, ce, _span, term, _d in cands:
+        if any(not (ce <= a or cs >= b) for a, b, _t in used):
+            continue
+        used.append((cs, ce, term))
+    return used
 
 
 def apply_pairs(text, pairs):
@@ -152,26 +229,29 @@ def apply_pairs(text, pairs):
     return text
 
 
-def correct(model, tok, case, rank_k):
-    """Rank rule: replace a phonetic-candidate span with its term when the ORIGINAL span is
-    contextually unexpected — mean token rank > rank_k. Never scores the (OOV) term."""
+def case_ranks(model, tok, case):
+    """(text after pairs, [(cs, ce, term)], [rank or None]) — independent of K, so computed once per
+    case and model and swept over every K with `apply_rank_k`."""
     text = apply_pairs(case["text"], case["pairs"])
-    cands = gen_vocab_candidates(text, case["vocab"])
-    cands.sort(key=lambda c: (-c[0], c[5]))  # longer spans, then closest term
-    used = []
-    edits = []
-    for _n, cs, ce, _span, term, _d in cands:
-        if any(not (ce <= a or cs >= b) for a, b in used):
-            continue
-        used.append((cs, ce))
-        r = mean_rank(model, tok, text, cs, ce)
-        if r is not None and r > rank_k:  # original is unexpected -> trust the phonetic candidate
-            edits.append((cs, ce, term))
+    spans = pick_spans(gen_vocab_candidates(text, case["vocab"]))
+    ranks = mean_ranks(model, tok, [(text, [(cs, ce) for cs, ce, _t in spans])])[0] if spans else []
+    return text, spans, ranks
+
+
+def apply_rank_k(text, spans, ranks, rank_k):
+    # original is unexpected -> trust the phonetic candidate
+    edits = [(cs, ce, term) for (cs, ce, term), r in zip(spans, ranks) if r is not None and r > rank_k]
     for cs, ce, term in sorted(edits, reverse=True):
         text = text[:cs] + term + text[ce:]
     return text
 
 
+def correct(model, tok, case, rank_k):
+    """Rank rule: replace a phonetic-candidate span with its term when the ORIGINAL span is
+    contextually unexpected — mean token rank > rank_k. Never scores the (OOV) term."""
+    return apply_rank_k(*case_ranks(model, tok, case), rank_k)
+
+
 def passes(out, case):
     low = out.lower()
     return (all(s.lower() in low for s in case["contains"])
@@ -194,18 +274,22 @@ def main():
             continue
         # warm up (first pass pays graph init)
         mean_rank(model, tok, "warm up the model now.", 0, 4)
-        # pick best rank threshold
+        # ranks once per case (the latency under test), then pick the best rank threshold from them
+        reset_timing()
+        t0 = time.perf_counter()
+        ranked = [case_ranks(model, tok, c) for c in CASES]
+        wall = time.perf_counter() - t0
+        dt = live_ms(wall, len(CASES))
+        split = timing_line(len(CASES), wall)
         best = None
         for k in RANK_KS:
-            t0 = time.perf_counter()
-            outs = [correct(model, tok, c, k) for c in CASES]
-            dt = (time.perf_counter() - t0) / len(CASES) * 1000
+            outs = [apply_rank_k(*r, k) for r in ranked]
             acc = sum(passes(o, c) for o, c in zip(outs, CASES))
             if best is None or acc > best[0]:
-                best = (acc, k, dt, outs)
-        acc, margin, dt, outs = best
+                best = (acc, k, outs)
+        acc, margin, outs = best
         ok_lat = dt <= LATENCY_CAP_MS
-        print(f"  best: {acc}/{len(CASES)} @ rankK {margin}  |  {dt:.0f} ms/utterance  "
+        print(f"  best: {acc}/{len(CASES)} @ rankK {margin}  |  {dt:.0f} ms/utterance ({split})  "
               f"[{'UNDER cap' if ok_lat else 'OVER cap'}]")
         for o, c in zip(outs, CASES):
             print(f"    [{'PASS' if passes(o, c) else 'FAIL'}] {o}")
@@ -0,0 +1,265 @@
+#!/usr/bin/env python3
+"""Patch the mmBERT masked-LM ONNX artifact so the LM head only runs on the masked slots.
+
+WHY
+---
+The rank rule reads ONE vocabulary row per masked token (`logits[j, ti]`), yet the export computes
+and returns the full `(R, L, V)` logits: for mmBERT's ~256k vocabulary that is megabytes of float
+output per candidate, and the head's dense + decoder matmuls run on every position, nearly all
+of them thrown away. Gathering the hidden state of the masked slot BEFORE the head cuts both
+output memory and head compute by a factor of the sequence length L.
+
+WHAT
+----
+Proto-only edit (external weight data untouched; the patched graph is written next to the source so
+sidecars keep resolving by relative name):
+
+  * new input `masked_positions (R,)` int64: the masked token index of each row;
+  * the encoder's final hidden state (the output of the second-to-last norm on the path to the
+    logits, i.e. the one just before the head's own norm, or `--hidden NAME`) is gathered per row
+    with `GatherND(batch_dims=1)` into `(R, H)`, and only the head's nodes are rewired to it, so
+    any other consumer (a `last_hidden_state` output) is unchanged;
+  * the logits output becomes `(R, V)`;
+  * `--rank` goes further: new input `true_ids (R,)` int64, and the only output is `ranks (R,)`
+    int64, the count of vocabulary logits above the true token's, computed in-graph. Nothing of
+    size V leaves the session.
+
+The graph is stamped `winstt_masked_head=logits|rank`. `eval_onnx_artifact.py` feeds the new inputs
+whenever the artifact declares them.
+
+VERIFY
+------
+The source and the patched graph get the same deterministic random rows (ids, one masked slot per
+row, ones as attention). The source's `logits[j, pos[j]]` rows and the ranks derived from them must
+match the patched output. A float head's logits must match within `--atol` (default 1e-4). An int8
+head re-derives its dynamic activation scale from the gathered rows only, so its logits move
+slightly. Its ranks, like those of `--rank` output, may therefore differ by up to `--rank-tol` of
+their value (default 2%) or `--rank-floor` (default 10), whichever is larger; low ranks sit far below
+the rule's K, so a few places there decide nothing. Any larger difference fails the run and nothing
+is kept.
+
+USAGE
+-----
+    python tools/bench/mmbert_masked_head.py [model] [--out PATH] [--rank] [--hidden NAME]
+        [--rows 8] [--seq 32] [--rank-tol 0.02] [--rank-floor 10] [--atol 1e-4]
+
+`model` is a local `.onnx` or a file of `$MMBERT_REPO` (default `onnx/model_int8.onnx`, fetched
+with `hf_hub_download`). The output defaults to `<stem>.masked_head.onnx` (`.masked_rank.onnx` with
+`--rank`) in the same directory; a source with external data must be patched into its own directory.
+"""
+from __future__ import annotations
+
+import argparse
+import os
+
+import numpy as np
+import onnx
+import onnxruntime as ort
+from onnx import TensorProto, helper
+
+REPO = os.environ.get("MMBERT_REPO", "onnx-community/mmBERT-base-ONNX")
+NORM_OPS = {"LayerNormalization", "SimplifiedLayerNormalization", "SkipLayerNormalization",
+            "SkipSimplifiedLayerNormalization", "RMSNormalization"}
+PREFIX = "masked_head/"
+# Head ops that make its logits depend on the rows it sees (dynamic activation scales).
+QUANT_OPS = {"DynamicQuantizeLinear", "QuantizeLinear", "DequantizeLinear", "MatMulInteger",
+             "MatMulIntegerToFloat", "DynamicQuantizeMatMul", "QLinearMatMul", "QAttention"}
+
+
+def resolve(model: str) -> str:
+    if os.path.isfile(model):
+        return model
+    from huggingface_hub import hf_hub_download
+    return hf_hub_download(REPO, model)
+
+
+def default_opset(m: onnx.ModelProto) -> int:
+    return next((o.version for o in m.opset_import if o.domain in ("", "ai.onnx")), 0)
+
+
+def ancestors(graph, out_name: str) -> set:
+    """Indices of the nodes `out_name` depends on."""
+    producer = {o: i for i, n in enumerate(graph.node) for o in n.output if o}
+    seen, stack = set(), [out_name]
+    while stack:
+        i = producer.get(stack.pop())
+        if i is None or i in seen:
+            continue
+        seen.add(i)
+        stack += [t for t in graph.node[i].input if t]
+    return seen
+
+
+def find_hidden(graph, logits: str, hidden: str | None):
+    """(gather tensor, index of its producer, indices of the head nodes it feeds)."""
+    up = ancestors(graph, logits)
+    if hidden is None:
+        norms = sorted(i for i in up if graph.node[i].op_type in NORM_OPS)
+        if len(norms) < 2:
+            raise SystemExit(f"found {len(norms)} norm node(s) on the path to {logits!r}; "
+                             "name the encoder's final hidden state with --hidden")
+        hidden = graph.node[norms[-2]].output[0]
+    at = next((i for i in up if hidden in graph.node[i].output), None)
+    if at is None:
+        raise SystemExit(f"{hidden!r} is not produced on the path to {logits!r}")
+    head = ancestors(graph, logits) - ancestors(graph, hidden)
+    outputs = {o.name for o in graph.output[1:]}
+    clash = outputs & {t for i in head for t in graph.node[i].output}
+    if clash:
+        raise SystemExit(f"gathering at {hidden!r} would also cut graph output(s) {sorted(clash)} to the "
+                         "masked rows; pick a later --hidden")
+    return hidden, at, sorted(head)
+
+
+def has_external_data(m: onnx.ModelProto) -> bool:
+    return any(t.data_location == TensorProto.EXTERNAL for t in m.graph.initializer)
+
+
+def patch(m: onnx.ModelProto, rank: bool, hidden: str | None) -> tuple[onnx.ModelProto, str, bool]:
+    """Returns (patched model, mode, whether the head has quantized ops)."""
+    g = m.graph
+    opset = default_opset(m)
+    if opset < 12:
+        raise SystemExit(f"opset {opset}: GatherND batch_dims needs >= 12")
+    if any(i.name == "masked_positions" for i in g.input):
+        raise SystemExit("graph already declares masked_positions")
+    logits = g.output[0].name
+    hidden, at, head = find_hidden(g, logits, hidden)
+    quantized = any(g.node[i].op_type in QUANT_OPS for i in head)
+    stale = {t for i in head for t in g.node[i].output}
+    gathered = PREFIX + "hidden"
+    for i in head:
+        n = g.node[i]
+        for k, t in enumerate(n.input):
+            if t == hidden:
+                n.input[k] = gathered
+    nodes = [helper.make_node("Unsqueeze", ["masked_positions", PREFIX + "axis1"], [PREFIX + "pos_col"],
+                              name=PREFIX + "pos_col")
+             if opset >= 13 else
+             helper.make_node("Unsqueeze", ["masked_positions"], [PREFIX + "pos_col"], axes=[1],
+                              name=PREFIX + "pos_col"),
+             helper.make_node("GatherND", [hidden, PREFIX + "pos_col"], [gathered], batch_dims=1,
+                              name=PREFIX + "gather")]
+    for k, n in enumerate(nodes):
+        g.node.insert(at + 1 + k, n)
+    g.initializer.append(helper.make_tensor(PREFIX + "axis1", TensorProto.INT64, [1], [1]))
+    g.input.append(helper.make_tensor_value_info("masked_positions", TensorProto.INT64, ["masked_rows"]))
+
+    # Head tensors were (B, L, ...); drop their stale shapes and let ORT infer the (R, ...) ones.
+    keep = [v for v in g.value_info if v.name not in stale]
+    del g.value_info[:]
+    g.value_info.extend(keep)
+    out = g.output[0]
+    vocab = onnx.TensorShapeProto.Dimension()
+    vocab.CopyFrom(out.type.tensor_type.shape.dim[-1])
+    del out.type.tensor_type.shape.dim[:]
+    out.type.tensor_type.shape.dim.add().dim_param = "masked_rows"
+    out.type.tensor_type.shape.dim.add().CopyFrom(vocab)
+
+    mode = "logits"
+    if rank:
+        mode = "rank"
+        g.input.append(helper.make_tensor_value_info("true_ids", TensorProto.INT64, ["masked_rows"]))
+        g.node.extend([
+            helper.make_node("Unsqueeze", ["true_ids", PREFIX + "axis1"], [PREFIX + "true_col"],
+                             name=PREFIX + "true_col")
+            if opset >= 13 else
+            helper.make_node("Unsqueeze", ["true_ids"], [PREFIX + "true_col"], axes=[1], name=PREFIX + "true_col"),
+            helper.make_node("GatherElements", [logits, PREFIX + "true_col"], [PREFIX + "true_logit"], axis=1,
+                             name=PREFIX + "true_logit"),
+            helper.make_node("Greater", [logits, PREFIX + "true_logit"], [PREFIX + "above"], name=PREFIX + "above"),
+            helper.make_node("Cast", [PREFIX + "above"], [PREFIX + "above_i64"], to=TensorProto.INT64,
+                             name=PREFIX + "above_i64"),
+            helper.make_node("ReduceSum", [PREFIX + "above_i64", PREFIX + "axis1"], ["ranks"], keepdims=0,
+                             name=PREFIX + "ranks")
+            if opset >= 13 else
+            helper.make_node("ReduceSum", [PREFIX + "above_i64"], ["ranks"], axes=[1], keepdims=0,
+                             name=PREFIX + "ranks"),
+        ])
+        del g.output[:]
+        g.output.append(helper.make_tensor_value_info("ranks", TensorProto.INT64, ["masked_rows"]))
+    e = m.metadata_props.add()
+    e.key, e.value = "winstt_masked_head", mode
+    print(f"  gather at {hidden!r} ({len(head)} {'quantized ' if quantized else ''}head nodes rewired) "
+          f"-> {g.output[0].name}")
+    return m, mode, quantized
+
+
+def random_rows(sess, rows: int, seq: int, rng):
+    vocab = sess.get_outputs()[0].shape[-1]
+    vocab = vocab if isinstance(vocab, int) else 1000
+    ids = rng.integers(5, vocab, size=(rows, seq), dtype=np.int64)
+    pos = rng.integers(1, seq - 1, size=rows, dtype=np.int64)
+    true = ids[np.arange(rows), pos].copy()
+    ids[np.arange(rows), pos] = 4  # any fixed id stands in for <mask>; both graphs see the same rows
+    feeds = {"input_ids": ids, "attention_mask": np.ones_like(ids), "token_type_ids": np.zeros_like(ids)}
+    return {k: v for k, v in feeds.items() if k in {i.name for i in sess.get_inputs()}}, pos, true
+
+
+def verify(src: str, dst: str, mode: str, rows: int, seq: int, rank_tol: float, rank_floor: int,
+           quantized: bool = True, atol: float = 1e-4) -> bool:
+    """Logits of a float head must match within `atol`; ranks (and an int8 head's logits) within the
+    rank tolerance."""
+    so = ort.SessionOptions()
+    a = ort.InferenceSession(src, so, providers=["CPUExecutionProvider"])
+    b = ort.InferenceSession(dst, so, providers=["CPUExecutionProvider"])
+    feeds, pos, true = random_rows(a, rows, seq, np.random.default_rng(0))
+    full = a.run(None, feeds)[0]  # (R, L, V)
+    want = full[np.arange(rows), pos].astype(np.float32)
+    want_rank = (want > want[np.arange(rows), true][:, None]).sum(1)
+    extra = {"masked_positions": pos, **({"true_ids": true} if mode == "rank" else {})}
+    got = b.run(None, {**feeds, **extra})[0]
+    if mode == "rank":
+        got_rank, diff = got, None
+    else:
+        got = got.astype(np.float32)
+        got_rank = (got > got[np.arange(rows), true][:, None]).sum(1)
+        diff = float(np.abs(got - want).max())
+    drift = np.abs(got_rank - want_rank)
+    if diff is not None and not quantized:
+        ok = bool(np.allclose(got, want, rtol=0.0, atol=atol))
+    else:
+        ok = bool((drift <= np.maximum(rank_floor, rank_tol * want_rank)).all())
+    out_mb = full.nbytes / 2**20
+    print(f"  {rows} rows x {seq} tokens: source logits {out_mb:.2f} MB -> {got.nbytes / 2**20:.4f} MB"
+          + (f" | max|logit diff| {diff:.3g}" if diff is not None else "")
+          + f" | max rank drift {int(drift.max())} (ranks {want_rank.min()}..{want_rank.max()})"
+          + f"  [{'OK' if ok else 'MISMATCH'}]")
+    return ok
+
+
+def main() -> None:
+    ap = argparse.ArgumentParser(description=__doc__.split("\n")[0])
+    ap.add_argument("model", nargs="?", default="onnx/model_int8.onnx",
+                    help=f"local .onnx, or a file of $MMBERT_REPO ({REPO})")
+    ap.add_argument("--out", help="output path (default: <stem>.masked_head.onnx next to the source)")
+    ap.add_argument("--rank", action="store_true", help="output in-graph ranks given true_ids")
+    ap.add_argument("--hidden", help="tensor to gather (default: auto, the encoder's final norm output)")
+    ap.add_argument("--rows", type=int, default=8, help="masked rows in the parity check (default 8)")
+    ap.add_argument("--seq", type=int, default=32, help="sequence length in the parity check (default 32)")
+    ap.add_argument("--rank-tol", type=float, default=0.02,
+                    help="allowed relative rank drift per row (default 0.02)")
+    ap.add_argument("--rank-floor", type=int, default=10,
+                    help="allowed absolute rank drift per row, for low ranks (default 10)")
+    ap.add_argument("--atol", type=float, default=1e-4,
+                    help="allowed logit difference of a float (non-quantized) head (default 1e-4)")
+    args = ap.parse_args()
+
+    src = resolve(args.model)
+    stem = os.path.splitext(src)[0]
+    dst = args.out or f"{stem}.{'masked_rank' if args.rank else 'masked_head'}.onnx"
+    print(f"{src} -> {dst}")
+    m = onnx.load(src, load_external_data=False)
+    src_dir, dst_dir = (os.path.dirname(os.path.abspath(p)) for p in (src, dst))
+    if has_external_data(m) and dst_dir != src_dir:  # sidecars resolve relative to the graph
+        raise SystemExit(f"{src} keeps its weights in external data: write the patch into {src_dir}, "
+                         f"not {dst_dir}")
+    m, mode, quantized = patch(m, args.rank, args.hidden)
+    onnx.save(m, dst)
+    if not verify(src, dst, mode, args.rows, args.seq, args.rank_tol, args.rank_floor, quantized, args.atol):
+        os.remove(dst)
+        raise SystemExit("patched head disagrees with the source artifact (removed)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,217 @@
+#!/usr/bin/env python3
+"""Phonetic candidate generation for the encoder-dictionary evals, with a per-dictionary index.
+
+`gen_vocab_candidates` used to loop over every dictionary term, re-running `soundex` on both sides and
+a full `lev` for every 1-2 word window, so an utterance cost terms × windows × word-length². A power
+user's dictionary holds thousands of brand / jargon terms. `VocabIndex` is built ONCE per dictionary:
+
+  * soundex buckets: a window's soundex key is computed once and looks up only the terms sharing it;
+  * a length-banded edit index for the other branch of `phonetic_close` (lev ratio < 0.34). A match
+    needs |len difference| <= lev < 0.34·max(len), so only term lengths in the window's band are
+    searched, each at the radius r its length allows. Every term is cut into r + 1 pieces, one of
+    which an r-edit match must contain verbatim within ±r of its position (pigeonhole). Terms
+    sharing such a piece must also share max(len) - 1 - 2r bigrams (q-gram lemma) before the exact
+    ratio test runs on them.
+
+Per window the work is one soundex, a few dozen dict lookups and the thresholded distance check
+(`edit_distance.lev_within`) of the terms that survive both filters. It grows with the number of
+genuinely close terms, not with the dictionary. The candidates (and their order) are exactly those
+of the old per-term scan, kept here as `scan_vocab_candidates` for the parity check in
+`bench_vocab_index.py`.
+"""
+import math
+import os
+import re
+import sys
+from functools import lru_cache
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+from edit_distance import lev_myers, lev_ratio_below, lev_within  # noqa: E402
+
+EDIT_RATIO_MAX = 0.34
+WORD_RE = re.compile(r"[A-Za-z0-9À-ɏЀ-ӿ؀-ۿ]+")
+
+
+def soundex(s: str) -> str:
+    s = "".join(c for c in s.lower() if c.isalpha())
+    if not s:
+        return ""
+    codes = {**dict.fromkeys("bfpv", "1"), **dict.fromkeys("cgjkqsxz", "2"),
+             **dict.fromkeys("dt", "3"), "l": "4", **dict.fromkeys("mn", "5"), "r": "6"}
+    out = s[0].upper()
+    prev = codes.get(s[0], "")
+    for ch in s[1:]:
+        c = codes.get(ch, "")
+        if c and c != prev:
+            out += c
+        if ch not in "hw":
+            prev = c
+    return (out + "000")[:4]
+
+
+def lev(a: str, b: str) -> int:
+    m, n = len(a), len(b)
+    if not m:
+        return n
+    if not n:
+        return m
+    prev = list(range(n + 1))
+    for i in range(1, m + 1):
+        cur = [i] + [0] * n
+        for j in range(1, n + 1):
+            cur[j] = min(prev[j] + 1, cur[j - 1] + 1, prev[j - 1] + (a[i - 1] != b[j - 1]))
+        prev = cur
+    return prev[n]
+
+
+def phonetic_close(a: str, b: str) -> bool:
+    a, b = a.lower(), b.lower()
+    if a == b:
+        return True
+    if soundex(a) and soundex(a) == soundex(b):
+        return True
+    # Edit-only matches (different soundex) must be MUCH closer — 0.5 let garbage through
+    # ("please"~"supabase", "mute"~"vite" both 0.50). Genuine corruptions are well under 0.34;
+    # real phonetic collisions (video/veet/vat ~ Vite) come in via the soundex branch above.
+    return lev_ratio_below(a, b, EDIT_RATIO_MAX) is not None
+
+
+def term_norm(term: str) -> str:
+    return "".join(c for c in term.lower() if c.isalnum())
+
+
+def edit_radius(n: int, t: int) -> int:
+    """Largest lev distance an edit-only match between lengths `n` and `t` can have (-1: none):
+    d < 0.34·max(n, t), and d >= |n - t| always."""
+    r = math.ceil(EDIT_RATIO_MAX * max(n, t)) - 1
+    return r if r >= abs(n - t) else -1
+
+
+def length_band(n: int) -> range:
+    """Term lengths an edit-only match of a length-`n` window can have: |n - t| < 0.34·max(n, t)."""
+    return range(max(1, math.floor(n * (1 - EDIT_RATIO_MAX))), int(n / (1 - EDIT_RATIO_MAX)) + 2)
+
+
+def pieces(t: int, r: int) -> list:
+    """(start, length) of the r + 1 near-equal pieces a length-`t` term is cut into for radius `r`."""
+    k = min(r + 1, t)
+    size, extra = divmod(t, k)
+    out, start = [], 0
+    for j in range(k):
+        out.append((start, size + (j < extra)))
+        start += size + (j < extra)
+    return out
+
+
+def bigrams(s: str) -> dict:
+    out = {}
+    for k in range(len(s) - 1):
+        out[s[k:k + 2]] = out.get(s[k:k + 2], 0) + 1
+    return out
+
+
+class VocabIndex:
+    """Soundex buckets + a length-banded piece / bigram index over one dictionary, built once and
+    queried per utterance window."""
+
+    def __init__(self, vocab):
+        self.vocab = list(vocab)
+        self.norms = [term_norm(t) for t in self.vocab]
+        self.by_soundex = {}
+        self.pieces = {}  # (term length, radius, piece #, piece text) -> term ids
+        self.bigrams = {}  # (term length, bigram) -> [(term id, count)]
+        for i, norm in enumerate(self.norms):
+            if not norm:  # nothing can sound like an empty term
+                continue
+            key = soundex(norm)
+            if key:
+                self.by_soundex.setdefault(key, []).append(i)
+            t = len(norm)
+            radii = {edit_radius(n, t) for n in range(1, int(t / (1 - EDIT_RATIO_MAX)) + 2)} - {-1}
+            for r in radii:
+                for j, (p, size) in enumerate(pieces(t, r)):
+                    self.pieces.setdefault((t, r, j, norm[p:p + size]), []).append(i)
+            for g, c in bigrams(norm).items():
+                self.bigrams.setdefault((t, g), []).append((i, c))
+
+    def _edit_matches(self, w: str, t: int, r: int, grams: dict) -> list:
+        """Ids of length-`t` terms within lev `r` of `w` (filters first, exact `lev` last), with d."""
+        n = len(w)
+        cand = set()
+        for j, (p, size) in enumerate(pieces(t, r)):
+            for s in range(max(0, p - r), min(n - size, p + r) + 1):
+                cand.update(self.pieces.get((t, r, j, w[s:s + size]), ()))
+        need = max(n, t) - 1 - 2 * r
+        if need > 0 and cand:
+            shared = {}
+            for g, c in grams.items():
+                for i, tc in self.bigrams.get((t, g), ()):
+                    if i in cand:
+                        shared[i] = shared.get(i, 0) + min(c, tc)
+            cand = [i for i, c in shared.items() if c >= need]
+        out = []
+        for i in cand:
+            d = lev_within(w, self.norms[i], r)
+            if d is not None and d / max(n, t) < EDIT_RATIO_MAX:
+                out.append((i, d))
+        return out
+
+    def matches(self, span_norm):
+        """Term ids `phonetic_close` to `span_norm` (already lowercased), each with its lev distance."""
+        hits = {}
+        n = len(span_norm)
+        grams = bigrams(span_norm)
+        for t in length_band(n):
+            r = edit_radius(n, t)
+            if r >= 0:
+                hits.update(self._edit_matches(span_norm, t, r, grams))
+        key = soundex(span_norm)
+        for i in self.by_soundex.get(key, ()) if key else ():
+            if i not in hits:
+                hits[i] = lev_myers(span_norm, self.norms[i])
+        return hits
+
+    def candidates(self, text):
+        """Same tuples, in the same order, as the per-term scan: by term, then 2-word before 1-word
+        windows, then position. Each window is normalized and keyed once."""
+        words = [(m.group(0), m.start(), m.end()) for m in WORD_RE.finditer(text)]
+        found = []
+        for rank, n in enumerate((2, 1)):
+            for i in range(len(words) - n + 1):
+                span = words[i:i + n]
+                span_norm = "".join(w[0].lower() for w in span)
+                for term_id, d in self.matches(span_norm).items():
+                    found.append(((term_id, rank, i), (n, span[0][1], span[-1][2],
+                                                      text[span[0][1]:span[-1][2]], self.vocab[term_id], d)))
+        found.sort(key=lambda kv: kv[0])
+        return [c for _, c in found]
+
+
+@lru_cache(maxsize=16)
+def _index_for(vocab):
+    return VocabIndex(vocab)
+
+
+def gen_vocab_candidates(text, vocab):
+    """Permissive: propose (n_words, start, end, span_text, term, lev) for 1-2 word windows near a term.
+    Longer spans first so "oh llama"->"ollama" beats the 1-word "llama"->"ollama".
+    `vocab` is a term list (its index is built once and cached) or a prebuilt `VocabIndex`."""
+    index = vocab if isinstance(vocab, VocabIndex) else _index_for(tuple(vocab))
+    return index.candidates(text)
+
+
+def scan_vocab_candidates(text, vocab):
+    """Reference: the original every-term × every-window scan (parity baseline for the index)."""
+    words = [(m.group(0), m.start(), m.end()) for m in WORD_RE.finditer(text)]
+    cands = []
+    for term in vocab:
+        tnorm = term_norm(term)
+        for n in (2, 1):
+            for i in range(len(words) - n + 1):
+                span = words[i:i + n]
+                span_norm = "".join(w[0].lower() for w in span)
+                if phonetic_close(span_norm, tnorm):
+                    d = lev(span_norm, tnorm)
+                    cands.append((n, span[0][1], span[-1][2],
+                                  text[span[0][1]:span[-1][2]], term, d))
+    return cands
@@ -0,0 +1,395 @@
+#!/usr/bin/env python3
+"""Sweep every decoder `cohere_decompose_attention.py` emitted against its SOURCE decoder over random
+prompts, encoder lengths and decode depths, and report max logit drift + per-token latency.
+
+WHY
+---
+The converter's `--check` (`parity_check`) proves each graph on ONE tiny case — a 4-token prompt, two
+decode steps, 6 encoder frames — with fresh numpy feeds every step (Python-loop-built
+`kv_write_mat` / `attn_bias`, new zeroed 1024-slot KV buffers). That says nothing about a 900-frame
+clip decoding its 600th token, and any timing taken there measures feed construction, not the graph.
+One run of this harness gives both the correctness envelope and a realistic per-token timing of the
+graphs we ship.
+
+WHAT
+----
+Per trial: a random mel clip (encoder length up to the largest cross bucket, cycling through the
+buckets so every `_x<B>` decoder gets trials), a random 1..8-token prompt and a random decode depth
+up to `--max-depth`. The converted encoder runs once; the source decoder (growing KV, its own
+cross-attention over `encoder_hidden_states`) decodes greedily and defines the token sequence and
+the reference logits; every emitted decoder is then teacher-forced through the same tokens:
+
+  * static (`attn_bias`) decoders ping-pong two preallocated KV buffer sets through IOBinding; the
+    masks / ids / write slots are preallocated numpy arrays bound ONCE as OrtValues sharing their
+    memory, and a step updates two slots in place (no per-step allocation, no loop over the buffer);
+  * dynamic (`_dyn`, `_cpu`, and the source) decoders hand each step's `present.*` OrtValues straight
+    back as the next `past_key_values.*` — no host copy of the KV;
+  * prefill (`_pf<S>`) decoders write prompt[:-1] in one call, then their paired step decoder
+    continues on the same buffers;
+  * batched (`_b<B>`) decoders run the trial in row 0 with the other rows parked on the scratch slot
+    (latency is per CALL, i.e. per B row-steps).
+
+A trial is truncated to what a decoder holds (its KV tier; a `_x<B>` decoder only takes the trials
+whose encoder emitted bucket B). Decoders run with ORT's default graph optimizations, as the engine
+does; the reference runs unoptimized, so the drift includes the optimizer's rounding. Fails (exit 1)
+if any decoder exceeds the `parity_check` tolerance.
+
+USAGE
+-----
+    python cohere_decoder_sweep.py --src <hf_snapshot_dir> --out <converted_dir> [--trials 8]
+        [--max-depth 1024] [--seed 0] [--only '*_dyn*'] [--threads N]
+"""
+from __future__ import annotations
+
+import argparse
+import fnmatch
+import glob
+import os
+import re
+import time
+
+import numpy as np
+import onnxruntime as ort
+
+from cohere_decompose_attention import NEG_F16, NEG_F32, model_dims
+
+# Suffixes the converter appends to `decoder_model_merged<precision>` (see its USAGE).
+VARIANT_RE = re.compile(r"^(_dyn|_cpu|(_kv\d+)?(_x\d+)?(_pf\d+|_b\d+)?)$")
+_DTYPES = {"tensor(float)": np.float32, "tensor(float16)": np.float16, "tensor(int64)": np.int64,
+           "tensor(int32)": np.int32, "tensor(int8)": np.int8, "tensor(bool)": np.bool_}
+PROMPT_MAX = 8
+
+
+def _session(path: str, threads: int, optimize: bool, profile_prefix: str | None = None) -> ort.InferenceSession:
+    so = ort.SessionOptions()
+    so.intra_op_num_threads = threads
+    so.log_severity_level = 3
+    if profile_prefix:
+        so.enable_profiling = True
+        so.profile_file_prefix = profile_prefix
+    if not optimize:
+        so.graph_optimization_level = ort.GraphOptimizationLevel.ORT_DISABLE_ALL
+    return ort.InferenceSession(path, so, providers=["CPUExecutionProvider"])
+
+
+def _ov(a: np.ndarray) -> ort.OrtValue:
+    """CPU OrtValue sharing `a`'s memory: in-place numpy writes are what the next run reads."""
+    # (`np.ascontiguousarray` would turn a 0-d scalar like `num_logits_to_keep` into shape (1,).)
+    return ort.OrtValue.ortvalue_from_numpy(a if a.flags.c_contiguous else np.ascontiguousarray(a))
+
+
+class Decoder:
+    """One decoder graph plus the declarations the runners need."""
+
+    def __init__(self, path: str, threads: int, optimize: bool = True, profile_prefix: str | None = None):
+        self.path = path
+        self.name = os.path.basename(path)
+        self.sess = _session(path, threads, optimize, profile_prefix)
+        self.inputs = {i.name: i for i in self.sess.get_inputs()}
+        self.outputs = [o.name for o in self.sess.get_outputs()]
+        self.dt = {n: _DTYPES[i.type] for n, i in self.inputs.items()}
+        meta = self.sess.get_modelmeta().custom_metadata_map
+        self.static = "attn_bias" in self.inputs
+        self.kmax = self.inputs["attn_bias"].shape[3] if self.static else None
+        self.batch = self.inputs["attn_bias"].shape[0] if self.static else 1
+        self.s_q = self.inputs["input_ids"].shape[1] if self.static else None
+        ck = next((i for n, i in self.inputs.items() if n.startswith("cross_attn.") and len(i.shape) == 4), None)
+        self.cross_len = ck.shape[2] if ck is not None and isinstance(ck.shape[2], int) else None
+        pk = next(n for n in self.inputs if n.startswith("past_key_values.") and ".decoder." in n)
+        self.nh, self.hd = self.inputs[pk].shape[1], self.inputs[pk].shape[3]
+        fp16 = self.dt[pk] == np.float16
+        compact = meta.get("winstt_cross_kv_dtype")
+        self.tol = {"fp16": 0.05, "int8": 0.5}.get(compact, 0.1 if fp16 else 1e-2)
+        self.neg = np.float16(NEG_F16) if fp16 else np.float32(NEG_F32)
+
+    def capacity(self) -> int:
+        """Tokens one sequence can hold (the batched scratch slot costs one)."""
+        if not self.static:
+            return 1 << 30
+        return self.kmax - (1 if self.batch > 1 else 0)
+
+
+class DynamicRunner:
+    """Growing-KV decoder over IOBinding: the previous step's `present.*` OrtValues are bound as the
+    next step's pasts as-is. Also drives the reference (source) decoder."""
+
+    def __init__(self, dec: Decoder, enc_feeds: dict[str, np.ndarray]):
+        self.d = dec
+        self.io = dec.sess.io_binding()
+        self.mask = np.ones((1, 4096), dtype=np.int64)
+        self.past: dict[str, ort.OrtValue] = {}
+        for n in dec.inputs:
+            if n in enc_feeds:
+                self.io.bind_ortvalue_input(n, _ov(enc_feeds[n].astype(dec.dt[n])))
+            elif n.startswith("past_key_values."):
+                self.past[n] = _ov(np.zeros((1, dec.nh, 0, dec.hd), dtype=dec.dt[n]))
+        if "num_logits_to_keep" in dec.inputs:
+            self.io.bind_ortvalue_input("num_logits_to_keep", _ov(np.array(1, dtype=np.int64)))
+        self.carry = [o for o in dec.outputs if o.replace("present.", "past_key_values.", 1) in dec.inputs]
+        self.out_names = ["logits"] + self.carry + [o for o in dec.outputs if o == "next_token"]
+        self.pos = 0
+
+    def step(self, ids: list[int]) -> np.ndarray:
+        d, io, total = self.d, self.io, self.pos + len(ids)
+        io.bind_ortvalue_input("input_ids", _ov(np.array([ids], dtype=np.int64)))
+        if "attention_mask" in d.inputs:
+            if total > self.mask.shape[1]:
+                self.mask = np.ones((1, 2 * total), dtype=np.int64)
+            io.bind_ortvalue_input("attention_mask", _ov(self.mask[:, :total]))
+        if "position_ids" in d.inputs:
+            io.bind_ortvalue_input("position_ids", _ov(np.arange(self.pos, total, dtype=np.int64)[None, :]))
+        if "use_cache_branch" in d.inputs:
+            io.bind_ortvalue_input("use_cache_branch", _ov(np.array([self.pos > 0])))
+        for n, v in self.past.items():
+            io.bind_ortvalue_input(n, v)
+        # Outputs grow every step: let ORT allocate them afresh (a run leaves them bound at its shape).
+        io.clear_binding_outputs()
+        for o in self.out_names:
+            io.bind_output(o, "cpu")
+        d.sess.run_with_iobinding(io)
+        outs = dict(zip(self.out_names, io.get_outputs()))
+        for o in self.carry:
+            self.past[o.replace("present.", "past_key_values.", 1)] = outs[o]
+        self.pos = total
+        logits = outs["logits"].numpy()[0, -1]
+        if "next_token" in outs:
+            assert int(outs["next_token"].numpy()[0, -1]) == int(logits.astype(np.float32).argmax()), \
+                f"{d.name}: greedy head next_token != argmax(logits)"
+        return logits
+
+
+class StaticRunner:
+    """Fixed-KV (`attn_bias`) decoder over IOBinding: two preallocated KV sets ping-pong between the
+    past inputs and the present outputs; masks, ids and write slots live in preallocated arrays whose
+    OrtValues are bound once, so a step is two in-place slot updates plus the run."""
+
+    def __init__(self, dec: Decoder, enc_feeds: dict[str, np.ndarray], kv: list[dict] | None = None):
+        self.d = d = dec
+        b, k, mdt = d.batch, d.kmax, d.dt["attn_bias"]
+        self.io = d.sess.io_binding()
+        self.kv_names = [n for n in d.inputs if n.startswith("past_key_values.") and ".decoder." in n]
+        self.kv = kv or [{n: _ov(np.zeros((b, d.nh, k, d.hd), dtype=d.dt[n])) for n in self.kv_names}
+                         for _ in range(2)]
+        self.ids = np.zeros((b, d.s_q), dtype=np.int64)
+        self.posn = np.zeros((b, d.s_q), dtype=np.int64)
+        self.keep = np.ones((b, 1, k, 1), dtype=mdt)
+        self.wmat = np.zeros((b, 1, k, d.s_q), dtype=mdt)
+        self.bias = np.full((b, 1, d.s_q, k), d.neg, dtype=mdt)
+        self.wpos = np.full(b, k - 1, dtype=np.int64)
+        # Parked rows (batched graphs): write and attend only the scratch slot k-1.
+        self.keep[1:, 0, k - 1, 0], self.wmat[1:, 0, k - 1, 0], self.bias[1:, 0, :, k - 1] = 0, 1, 0
+        fixed = {"input_ids": self.ids, "position_ids": self.posn, "kv_keep_mask": self.keep,
+                 "kv_write_mat": self.wmat, "attn_bias": self.bias, "kv_write_pos": self.wpos,
+                 "attention_mask": np.ones((b, k), dtype=np.int64),
+                 "num_logits_to_keep": np.array(1, dtype=np.int64),
+                 "use_cache_branch": np.array([True])}
+        for n, i in d.inputs.items():
+            if n in fixed:
+                self.io.bind_ortvalue_input(n, _ov(fixed[n]))
+            elif n == "encoder_hidden_states":  # pinned to (B, 1, hidden); unread after the hoist
+                self.io.bind_ortvalue_input(n, _ov(np.zeros((b, 1, i.shape[2]), dtype=d.dt[n])))
+            elif n in enc_feeds:
+                v = enc_feeds[n].astype(d.dt[n])
+                self.io.bind_ortvalue_input(n, _ov(np.repeat(v, b, axis=0) if v.ndim == 4 and b > 1 else v))
+            elif n.startswith("past_key_values.") and n not in self.kv_names:
+                self.io.bind_ortvalue_input(n, _ov(np.zeros((b, d.nh, 0, d.hd), dtype=d.dt[n])))
+        # Declared output shapes: (B, 1, V), or (B, S_q, V) on exports without `num_logits_to_keep`.
+        shapes = {o.name: [x if isinstance(x, int) else 1 for x in o.shape] for o in d.sess.get_outputs()}
+        self.logits = np.zeros(shapes["logits"], dtype=d.dt["attn_bias"])
+        self.io.bind_ortvalue_output("logits", _ov(self.logits))
+        self.next_token = np.zeros(shapes["next_token"], dtype=np.int64) if "next_token" in d.outputs else None
+        if self.next_token is not None:
+            self.io.bind_ortvalue_output("next_token", _ov(self.next_token))
+        self.cur = 0
+        self.last = None  # row-0 slots written by the previous call
+
+    def step(self, ids: list[int], pos: int) -> np.ndarray:
+        """Write `ids` (row 0) at slots pos.. and return the last position's logits."""
+        d, n = self.d, len(ids)
+        src, dst = self.kv[self.cur], self.kv[1 - self.cur]
+        for name in self.kv_names:
+            self.io.bind_ortvalue_input(name, src[name])
+            self.io.bind_ortvalue_output(name.replace("past_key_values.", "present.", 1), dst[name])
+        if self.last is not None:
+            self.keep[0, 0, self.last, 0] = 1
+            self.wmat[0, 0, self.last, :] = 0
+        slots = np.arange(pos, pos + d.s_q)
+        self.keep[0, 0, slots, 0] = 0
+        self.wmat[0, 0, slots, np.arange(d.s_q)] = 1
+        if d.s_q == 1:
+            self.bias[0, 0, 0, pos] = 0
+        else:  # prefill: query i sees keys <= pos + i (pad rows too — their slots are overwritten later)
+            self.bias[0, 0] = np.where(np.arange(d.kmax)[None, :] <= slots[:, None], 0, d.neg)
+        self.ids[0, :] = 0
+        self.ids[0, :n] = ids
+        self.posn[0] = slots
+        self.wpos[0] = pos
+        self.last = slots
+        d.sess.run_with_iobinding(self.io)
+        self.cur = 1 - self.cur
+        logits = self.logits[0, -1].copy()  # the bound buffer is overwritten by the next step
+        if self.next_token is not None:
+            assert int(self.next_token[0, -1]) == int(logits.astype(np.float32).argmax()), \
+                f"{d.name}: greedy head next_token != argmax(logits)"
+        return logits
+
+    def reset(self) -> None:
+        self.keep[0] = 1
+        self.wmat[0] = 0
+        self.bias[0] = self.d.neg
+        self.last = None
+
+
+class Stats:
+    def __init__(self):
+        self.trials = self.tokens = self.top1 = 0
+        self.drift = 0.0
+        self.ms: list[float] = []
+
+
+def run_variant(dec: Decoder, runner, step_dec: Decoder | None, tokens: list[int], n_prompt: int,
+                ref: list[np.ndarray], st: Stats, enc_feeds: dict) -> None:
+    """Teacher-force `tokens` through one decoder; compare the logits after the last prompt token and
+    after every decode token against `ref`; time every decode step."""
+    n = min(len(tokens), dec.capacity() if step_dec is None else step_dec.capacity())
+    if n < n_prompt:
+        return
+    logits = []
+    if isinstance(runner, DynamicRunner):
+        logits.append(runner.step(tokens[:n_prompt]))
+        start = n_prompt
+    elif step_dec is not None:  # prefill + paired step decoder on the same KV buffers
+        runner.reset()
+        if n_prompt > 1:
+            runner.step(tokens[: n_prompt - 1], 0)
+        stepper = StaticRunner(step_dec, enc_feeds, kv=runner.kv)
+        stepper.cur = runner.cur
+        stepper.bias[0, 0, 0, : n_prompt - 1] = 0
+        runner, start = stepper, n_prompt - 1
+    else:
+        runner.reset()
+        for j in range(n_prompt - 1):
+            runner.step([tokens[j]], j)
+        start = n_prompt - 1
+    for j in range(start, n):
+        t0 = time.perf_counter()
+        out = runner.step([tokens[j]], j) if isinstance(runner, StaticRunner) else runner.step([tokens[j]])
+        if j >= n_prompt:
+            st.ms.append((time.perf_counter() - t0) * 1e3)
+        logits.append(out)
+    for a, b in zip(ref, logits):
+        st.drift = max(st.drift, float(np.abs(a.astype(np.float32) - b.astype(np.float32)).max()))
+        st.top1 += int(a.astype(np.float32).argmax() == b.astype(np.float32).argmax())
+    st.tokens += min(len(ref), len(logits))
+    st.trials += 1
+
+
+def sweep_precision(src_dec: str, out_onnx: str, args, dims: dict, rng) -> bool:
+    sfx = os.path.basename(src_dec)[len("decoder_model_merged"):-len(".onnx")]
+    paths = []
+    for p in sorted(glob.glob(os.path.join(out_onnx, f"decoder_model_merged{sfx}*.onnx"))):
+        rest = os.path.basename(p)[len(f"decoder_model_merged{sfx}"):-len(".onnx")]
+        if VARIANT_RE.match(rest) and fnmatch.fnmatch(os.path.basename(p), args.only):
+            paths.append(p)
+    enc_path = os.path.join(out_onnx, f"encoder_model{sfx}.onnx")
+    if not paths or not os.path.exists(enc_path):
+        print(f"{os.path.basename(src_dec)}: no emitted decoders / encoder in {out_onnx} — skipped")
+        return True
+    ref_dec = Decoder(src_dec, args.threads, optimize=False)
+    decs = {p: Decoder(p, args.threads) for p in paths}
+    # Prefill graphs run paired with their step decoder (same name without `_pf<S>`).
+    steps = {p: decs.get(re.sub(r"_pf\d+(?=\.onnx$)", "", p)) for p in paths if re.search(r"_pf\d+\.onnx$", p)}
+    enc = _session(enc_path, args.threads, optimize=True)
+    feat = enc.get_inputs()[0]
+    axis = next((k for k, d in enumerate(feat.shape) if k and not isinstance(d, int)), None)
+    edt = _DTYPES[feat.type]
+    enc_outs = [o.name for o in enc.get_outputs()]
+
+    def encode(frames: int) -> dict[str, np.ndarray]:
+        shape = [1 if k == 0 else (frames if k == axis else d) for k, d in enumerate(feat.shape)]
+        return dict(zip(enc_outs, enc.run(None, {feat.name: (rng.randn(*shape) * 0.5).astype(edt)})))
+
+    # Encoder frames per output frame (the subsampling stride), probed once.
+    probe = 64
+    stride = probe / encode(probe)["last_hidden_state"].shape[1] if axis is not None else 1.0
+    buckets = sorted({d.cross_len for d in decs.values() if d.cross_len} or {dims["cross_max"]})
+    stats = {p: Stats() for p in paths}
+    vocab = ref_dec.sess.get_outputs()[0].shape[2]
+    vocab = vocab if isinstance(vocab, int) else 100  # prompt ids only need to be valid
+    for trial in range(args.trials):
+        # Cycle through the cross buckets so every `_x<B>` decoder sees trials.
+        hi = buckets[trial % len(buckets)]
+        lo = ([0] + buckets)[buckets.index(hi)]
+        s_enc = int(rng.randint(lo + 1, hi + 1))
+        e = encode(max(1, int(round(s_enc * stride)))) if axis is not None else encode(0)
+        enc_feeds = {n: v for n, v in e.items() if n != "last_hidden_state"}
+        enc_feeds["encoder_hidden_states"] = e["last_hidden_state"]
+        got_len = next((v.shape[2] for n, v in e.items() if n.startswith("cross_attn.") and v.ndim == 4), None)
+        prompt = [int(t) for t in rng.randint(0, vocab, rng.randint(1, PROMPT_MAX + 1))]
+        depth = int(rng.randint(1, args.max_depth - len(prompt) + 1))
+        ref_run = DynamicRunner(ref_dec, {"encoder_hidden_states": e["last_hidden_state"]})
+        ref = [ref_run.step(prompt)]
+        tokens = list(prompt)
+        for _ in range(depth):
+            tokens.append(int(ref[-1].astype(np.float32).argmax()))
+            ref.append(ref_run.step([tokens[-1]]))
+        ref = ref[:-1]  # the logits after the last token predict a token no decoder is fed
+        for p, dec in decs.items():
+            if dec.cross_len is not None and got_len is not None and dec.cross_len != got_len:
+                continue
+            if p in steps and (steps[p] is None or len(prompt) - 1 > dec.s_q):
+                continue
+            if p not in steps and dec.static and dec.s_q != 1:
+                continue
+            runner = StaticRunner(dec, enc_feeds) if dec.static else DynamicRunner(dec, enc_feeds)
+            run_variant(dec, runner, steps.get(p), tokens, len(prompt), ref, stats[p], enc_feeds)
+        print(f"  trial {trial + 1}/{args.trials}: enc={e['last_hidden_state'].shape[1]} "
+              f"prompt={len(prompt)} depth={depth}", flush=True)
+
+    ok = True
+    print(f"{'decoder':<44} {'trials':>6} {'tokens':>7} {'max|diff|':>10} {'top-1':>6} "
+          f"{'ms/tok':>7} {'p50':>6} {'p95':>6}")
+    for p, st in stats.items():
+        dec = decs[p]
+        if not st.trials:
+            print(f"{dec.name:<44} {'-':>6}  (no trial fit this decoder)")
+            continue
+        ms = np.array(st.ms) if st.ms else np.zeros(1)
+        flag = "" if st.drift < dec.tol else f"  FAIL (tol {dec.tol})"
+        ok &= not flag
+        per = f" /B{dec.batch}" if dec.batch > 1 else ""
+        print(f"{dec.name:<44} {st.trials:>6} {st.tokens:>7} {st.drift:>10.3g} "
+              f"{st.top1 / st.tokens:>6.1%} {ms.mean():>7.2f} {np.percentile(ms, 50):>6.2f} "
+              f"{np.percentile(ms, 95):>6.2f}{per}{flag}")
+    return ok
+
+
+def main() -> None:
+    ap = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    ap.add_argument("--src", required=True, help="HF snapshot dir the converter read (source decoders)")
+    ap.add_argument("--out", required=True, help="the converter's output dir")
+    ap.add_argument("--trials", type=int, default=8, help="random trials per precision (default 8)")
+    ap.add_argument("--max-depth", type=int,
+                    help="longest prompt + decode per trial (default: the config's kv_max)")
+    ap.add_argument("--seed", type=int, default=0)
+    ap.add_argument("--only", default="*", help="only sweep decoders whose file name matches this glob")
+    ap.add_argument("--threads", type=int, default=0, help="ORT intra-op threads (default: ORT's choice)")
+    args = ap.parse_args()
+    dims = model_dims(args.src)
+    args.max_depth = args.max_depth or dims["kv_max"]
+    if args.max_depth <= PROMPT_MAX:
+        raise SystemExit(f"--max-depth must exceed the longest prompt ({PROMPT_MAX})")
+    src_decs = sorted(glob.glob(os.path.join(args.src, "onnx", "decoder_model_merged*.onnx")))
+    if not src_decs:
+        raise SystemExit(f"no decoder_model_merged*.onnx in {args.src}/onnx")
+    rng = np.random.RandomState(args.seed)
+    ok = True
+    for src_dec in src_decs:
+        print(f"── {os.path.basename(src_dec)} " + "─" * max(0, 70 - len(os.path.basename(src_dec))))
+        ok &= sweep_precision(src_dec, os.path.join(args.out, "onnx"), args, dims, rng)
+    if not ok:
+        raise SystemExit("sweep: drift above tolerance (see FAIL rows)")
+
+
+if __name__ == "__main__":
+    main()
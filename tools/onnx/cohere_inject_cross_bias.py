@@ -28,9 +28,12 @@ counts are asserted first: exactly `2*layers` Softmaxes, `layers` of them cross.
 USAGE
 -----
     python cohere_inject_cross_bias.py --dir <onnx_dir> [--layers 8] [--dry-run]
+        [--profile 32 [--profile-dir DIR]]
 
 Patches every `decoder_model_merged*.onnx` in `--dir` IN PLACE (originals backed up as
-`<name>.pre_cross_bias.bak`); files that already declare `cross_bias` are skipped.
+`<name>.pre_cross_bias.bak`); files that already declare `cross_bias` are skipped. `--profile N`
+runs each verified patch for N decode calls under ORT's profiler (`ort_profile.py`) — so the cost of
+the new bias Adds shows per op and per layer — and writes the reports to `--profile-dir`.
 """
 from __future__ import annotations
 
@@ -43,13 +46,14 @@ import numpy as np
 import onnx
 from onnx import helper
 
-from cohere_decompose_attention import inject_cross_bias_adds
+from cohere_decompose_attention import inject_cross_bias_adds, prune_dead
+from graph_index import GraphIndex
 
 
 ENC_LEN = 6  # encoder key length used for every dynamic cross tensor in the A/B feeds
 
 
-def input_shape(i) -> list[int]:
+def input_shape(i, enc_len: int = ENC_LEN) -> list[int]:
     """Concrete feed shape for one declared input. Known symbols get semantically consistent
     values (total = past + seq so masks/concats line up); the per-input anonymous symbols of the
     auto-hoisted cross tensors get their KNOWN head layout — `cross_attn.N.encoder.value` is the
@@ -57,18 +61,18 @@ def input_shape(i) -> list[int]:
     key of the Arabic torch export. Values themselves need no attention semantics — both sessions
     receive the SAME arrays, so any runnable garbage proves the identity."""
     if ".encoder.value" in i.name and i.name.startswith("cross_attn."):
-        return [1, 8, ENC_LEN, 128]
+        return [1, 8, enc_len, 128]
     if i.name.startswith("cross_attn.hoisted."):
-        return [1, 8, 128, ENC_LEN]
+        return [1, 8, 128, enc_len]
     sym = {
         "batch_size": 1,
         "sequence_length": 2,
         "total_sequence_length": 2,  # = past_decoder (0) + sequence (2)
         "past_decoder_sequence_length": 0,
         "past_encoder_sequence_length": 0,
-        "encoder_sequence_length": ENC_LEN,
+        "encoder_sequence_length": enc_len,
     }
-    return [d if isinstance(d, int) else sym.get(str(d), ENC_LEN) for d in i.shape]
+    return [d if isinstance(d, int) else sym.get(str(d), enc_len) for d in i.shape]
 
 
 def build_feeds(sess, rng) -> dict:
@@ -96,7 +100,7 @@ def verify_identity(orig_path: str, new_path: str) -> None:
 
     so = ort.SessionOptions()
     so.graph_optimization_level = ort.GraphOptimizationLevel.ORT_DISABLE_ALL
-    so.log_severity_level = 3  # the hoisted decoders keep declared-but-unused weights — mute the spam
+    so.log_severity_level = 3  # the un-pruned original declares unused weights — mute the spam
     s0 = ort.InferenceSession(orig_path, so, providers=["CPUExecutionProvider"])
     s1 = ort.InferenceSession(new_path, so, providers=["CPUExecutionProvider"])
     feeds = build_feeds(s0, np.random.RandomState(0))
@@ -129,28 +133,40 @@ def verify_identity(orig_path: str, new_path: str) -> None:
     assert d_eff > 0.0, "masking the tail keys did not change the logits — the bias Add is dead"
 
 
-def patch_decoder(path: str, layers: int, dry_run: bool) -> None:
+def profile_shape(i) -> list[int] | None:
+    """Profiling feed shape of a symbolic auto-hoisted cross tensor (see `input_shape`)."""
+    if i.name.startswith("cross_attn.") and not all(isinstance(d, int) for d in i.shape):
+        from ort_profile import PROFILE_ENC_LEN
+
+        return input_shape(i, PROFILE_ENC_LEN)
+    return None
+
+
+def patch_decoder(path: str, layers: int, dry_run: bool, profile=None) -> dict | None:
     dec = onnx.load(path, load_external_data=False)
     g = dec.graph
     if any(i.name == "cross_bias" for i in g.input):
         print(f"{os.path.basename(path)}: already has cross_bias — skipped")
         return
-    n_softmax = sum(1 for n in g.node if n.op_type == "Softmax")
+    gi = GraphIndex(g)
+    n_softmax = len(gi.of_type("Softmax"))
     if n_softmax != 2 * layers:
         raise SystemExit(
             f"{os.path.basename(path)}: expected {2 * layers} Softmax nodes ({layers} self + "
             f"{layers} cross), found {n_softmax} — refusing to patch an unexpected layout"
         )
-    masked = inject_cross_bias_adds(g)
+    masked = inject_cross_bias_adds(gi)
     if masked != layers:
         raise SystemExit(
             f"{os.path.basename(path)}: injected {masked} cross biases, expected {layers} — "
             "the self/cross Softmax discriminator does not fit this graph"
         )
+    gi.commit()
     past0 = next(i for i in g.input if i.name.startswith("past_key_values.") and ".decoder." in i.name)
     elem = past0.type.tensor_type.elem_type
     g.input.append(helper.make_tensor_value_info("cross_bias", elem, [1, 1, 1, "enc_seq"]))
     del g.value_info[:]
+    n_dead, n_winit = prune_dead(g)  # hoisted decoders still declare the moved cross K/V weights
     if not any(e.key == "winstt_cross_bias" for e in dec.metadata_props):
         e = dec.metadata_props.add()
         e.key, e.value = "winstt_cross_bias", "dynamic"
@@ -161,15 +177,18 @@ def patch_decoder(path: str, layers: int, dry_run: bool) -> None:
     onnx.save(dec, tmp)
     onnx.checker.check_model(tmp, full_check=False)
     verify_identity(path, tmp)
+    summary = profile(tmp, os.path.basename(path)) if profile else None
     if dry_run:
         os.remove(tmp)
         print(f"{os.path.basename(path)}: OK (dry-run — not replaced), cross biases={masked}")
-        return
+        return summary
     bak = f"{path}.pre_cross_bias.bak"
     if not os.path.exists(bak):
         shutil.copy2(path, bak)
     os.replace(tmp, path)
-    print(f"{os.path.basename(path)}: PATCHED, cross biases={masked} (backup: {os.path.basename(bak)})")
+    print(f"{os.path.basename(path)}: PATCHED, cross biases={masked}, pruned {n_dead} node(s) / "
+          f"{n_winit} initializer(s) (backup: {os.path.basename(bak)})")
+    return summary
 
 
 def main() -> None:
@@ -177,14 +196,30 @@ def main() -> None:
     ap.add_argument("--dir", required=True, help="directory containing decoder_model_merged*.onnx")
     ap.add_argument("--layers", type=int, default=8, help="decoder layer count (default 8)")
     ap.add_argument("--dry-run", action="store_true", help="verify only, do not replace files")
+    ap.add_argument("--profile", type=int, default=0, metavar="N",
+                    help="run each patched decoder for N decode calls under ORT's profiler (default 0 = off)")
+    ap.add_argument("--profile-dir", metavar="DIR",
+                    help="where the --profile traces and profile.md/json go (default: <dir>_profile)")
     args = ap.parse_args()
 
     decs = [d for d in sorted(glob.glob(os.path.join(args.dir, "decoder_model_merged*.onnx")))
             if not d.endswith("_data")]
     if not decs:
         raise SystemExit(f"no decoder_model_merged*.onnx in {args.dir}")
-    for d in decs:
-        patch_decoder(d, args.layers, args.dry_run)
+    profile = None
+    if args.profile > 0:
+        from ort_profile import print_summary, profile_decoder, write_reports
+
+        report_dir = args.profile_dir or f"{args.dir.rstrip(os.sep)}_profile"
+
+        def profile(path: str, name: str) -> dict:
+            s = profile_decoder(path, report_dir, args.profile, shape_of=profile_shape, name=name)
+            print_summary(s)
+            return s
+
+    summaries = [patch_decoder(d, args.layers, args.dry_run, profile) for d in decs]
+    if profile:
+        write_reports([s for s in summaries if s], report_dir)
 
 
 if __name__ == "__main__":
@@ -0,0 +1,402 @@
+#!/usr/bin/env python3
+"""Predict how an execution provider partitions an exported graph: which nodes fall back to the
+host, how many subgraphs that makes, and which tensors cross host ↔ device every token. Offline,
+from a declarative support table; no GPU and no DirectML are needed, so it runs in CI on Linux.
+
+WHY
+---
+Every surgery pass in this directory exists because an op either has no DirectML kernel or runs
+wrongly on it. GroupQueryAttention mis-computes, the 3-D/4-D MultiHeadAttention form crashes, and
+the merged decoder's `If` drags everything it reads back to the CPU. A node without a kernel does
+not fail. ORT quietly assigns it to the CPU EP, splits the graph around it and inserts MemcpyToHost /
+MemcpyFromHost for every tensor that crosses. Nobody notices until the per-token latency moves.
+This tool makes that partition visible (and gateable) before an export is uploaded.
+
+WHAT
+----
+`ep_support.json` (or `--table`) lists, per EP:
+
+  * `default`, plus per-`domains` defaults (`com.microsoft` ops are opt-in on DirectML), and
+    `host: true` for an EP that computes in host memory (the CPU EP: no graph I/O copies);
+  * `ops`: per op type a support status, `yes` / `no` (host fallback) / `crash` / `wrong` (placed
+    on the device but fails or mis-computes there), with optional `when` rules on an input's rank
+    or dtype or on an attribute value;
+  * `dtypes_unsupported` and `max_rank`: any tensor of the node outside these sends it to the host;
+  * `cpu_inputs`: inputs a device kernel reads from host memory (shape / axes / pads operands),
+    and `metadata_inputs` (Shape / Size only look at the dims, no copy);
+  * `host_shape_ops`: integer shape arithmetic ORT keeps on the CPU when all its consumers read it
+    there (iterated to a fixpoint, like ORT's own CPU-preference pass).
+
+The graph is walked with `graph_cost.CostWalk` at concrete symbol bindings, so every tensor has a
+shape and a dtype, and an `If` runs the branch its condition selects. Each `If` is a host node whose
+inputs are its condition and every outer tensor the branch reads, and whose outputs are the branch
+results. Branch nodes then see those tensors as host-produced, which is exactly the copy traffic a
+merged decoder pays. Reported per graph:
+
+  * device / host node counts, with the host nodes by op and reason;
+  * partitions: connected same-EP node groups (the EP's subgraphs), with host groups made only of
+    shape arithmetic counted apart because they are cheap. The count is a prediction: ORT's
+    partitioner can merge or split further around Memcpy nodes;
+  * boundary tensors: every (tensor, direction) that crosses, with bytes at the bindings, summed as
+    the memcpy volume of one run (= per token for a decoder at `--step`), plus graph I/O transfers;
+  * `crash` / `wrong` nodes as errors, and symbolic input dims when the EP only fuses static shapes.
+
+USAGE
+-----
+    python ep_partition.py <graph.onnx> [...] [--ep dml] [--table ep_support.json] [--step 5]
+        [--enc-len 375] [--bucket 1024] [--bind SYM=N ...] [--top 12]
+        [--save parts.json] [--baseline parts.json] [--max-partitions N] [--max-copy-mb X]
+        [--allow-broken]
+
+Exits non-zero on a `crash` / `wrong` node (unless `--allow-broken`), on more partitions or copy bytes
+than the `--max-*` limits, or when a same-named graph has more partitions, host nodes or copy bytes
+than in `--baseline`.
+"""
+from __future__ import annotations
+
+import argparse
+import json
+import os
+
+import onnx
+
+from graph_cost import CostWalk, _fmt, _itemsize, _numel, add_binding_args, binding_label, bindings_from
+
+HOST, DEVICE = "host", "device"
+TABLE = os.path.join(os.path.dirname(os.path.abspath(__file__)), "ep_support.json")
+INT_ELEMS = {onnx.TensorProto.INT64, onnx.TensorProto.INT32, onnx.TensorProto.BOOL}
+
+
+def load_table(path: str, ep: str) -> dict:
+    with open(path, encoding="utf-8") as f:
+        table = json.load(f)
+    if ep not in table:
+        raise SystemExit(f"{path}: no entry for EP {ep!r} (have {', '.join(sorted(table))})")
+    return table[ep]
+
+
+def _dtype(elem: int | None) -> str:
+    return onnx.TensorProto.DataType.Name(elem).lower() if elem else "?"
+
+
+def _matches(rule: dict, n, w: CostWalk) -> bool:
+    if "input" in rule:
+        i = rule["input"]
+        name = n.input[i] if i < len(n.input) else ""
+        if not name:
+            return False
+        shape = w.shape.get(name)
+        if "rank" in rule and (shape is None or len(shape) != rule["rank"]):
+            return False
+        if "dtype" in rule and _dtype(w.elem.get(name)) not in rule["dtype"]:
+            return False
+    if "attr" in rule:
+        a = next((a for a in n.attribute if a.name == rule["attr"]), None)
+        if a is None or onnx.helper.get_attribute_value(a) != rule.get("equals"):
+            return False
+    return True
+
+
+def node_support(n, w: CostWalk, spec: dict) -> tuple[str, str]:
+    """(status, reason) of one node on the EP: yes / no / crash / wrong."""
+    dom = n.domain if n.domain not in ("", "ai.onnx") else ""
+    entry = spec.get("ops", {}).get(n.op_type)
+    if entry is not None and entry.get("domain", "") != dom:
+        entry = None  # same op name in another domain
+    if entry is not None:
+        status, why = entry["support"], entry.get("why", "")
+        for rule in entry.get("when", []):
+            if _matches(rule, n, w):
+                status, why = rule["support"], rule.get("why", why)
+    else:
+        status = spec.get("domains", {}).get(dom, spec.get("default", "yes")) if dom else spec.get("default", "yes")
+        why = f"{dom} op without a kernel" if status == "no" else ""
+    if status == "no":
+        return status, why
+    bad = set(spec.get("dtypes_unsupported", ()))
+    max_rank = spec.get("max_rank")
+    for t in [t for t in list(n.input) + list(n.output) if t]:
+        if _dtype(w.elem.get(t)) in bad:
+            return "no", f"{_dtype(w.elem.get(t))} tensor"
+        shape = w.shape.get(t)
+        if max_rank and shape is not None and len(shape) > max_rank:
+            return "no", f"rank {len(shape)} > {max_rank}"
+    return status, why
+
+
+class Partition:
+    """EP assignment, partitions and boundary tensors of one `CostWalk`."""
+
+    def __init__(self, w: CostWalk, model, spec: dict):
+        self.w = w
+        self.spec = spec
+        graph_inputs = {i.name for i in model.graph.input}
+        self.graph_outputs = [o.name for o in model.graph.output]
+        # Work items in execution order. An If becomes two host items around its inlined branch: the
+        # entry reads the condition and every outer tensor the branch uses, the exit collects the
+        # branch results into the If outputs (replacing the alias Identity nodes of the walk).
+        alias = {}  # If output -> index into w.ifs
+        for k, (f, _) in enumerate(w.ifs):
+            alias.update({o: k for o in f.output})
+        if_scope = {alias[n.output[0]]: s for n, s in zip(w.order, w.scope)
+                    if n.op_type == "Identity" and n.output and n.output[0] in alias}
+        self.items = []
+        entry: dict[int, int] = {}
+        closed: set[int] = set()
+        for n, s in zip(w.order, w.scope):
+            k = alias.get(n.output[0]) if n.op_type == "Identity" and n.output else None
+            if k is not None and n.name != w.ifs[k][0].name:
+                k = None
+            if s is not None and s not in entry:
+                self._open_if(s, if_scope.get(s), entry)
+            if k is None:
+                status, why = node_support(n, w, spec)
+                self.items.append({"name": n.name or f"{n.op_type}_{len(self.items)}", "op": n.op_type,
+                                   "inputs": list(n.input), "outputs": list(n.output), "scope": s,
+                                   "status": status, "why": why, "side": HOST if status == "no" else DEVICE})
+                continue
+            if k not in entry:  # branch without nodes: the If only forwards tensors
+                self._open_if(k, s, entry)
+            if k in closed:
+                continue
+            closed.add(k)
+            f = w.ifs[k][0]
+            forwarded = [next(m.input[0] for m in w.order if m.op_type == "Identity" and m.output[0] == o)
+                         for o in f.output]
+            self.items.append(dict(self.items[entry[k]], inputs=forwarded, outputs=list(f.output), scope=s,
+                                   exit=True))
+        implicit_of = {k: set(implicit) for k, (_, implicit) in enumerate(w.ifs)}
+        # A branch node reads outer tensors through its If's entry; everything else through its producer.
+        self.producer = {o: idx for idx, it in enumerate(self.items) for o in it["outputs"] if o}
+        self.edges = []  # (tensor, producer item or None for a graph input, consumer item, input index)
+        for idx, it in enumerate(self.items):
+            for k, t in enumerate(it["inputs"]):
+                if not t or t in w.inits:
+                    continue
+                s = it["scope"]
+                p = entry[s] if s is not None and t in implicit_of[s] else self.producer.get(t)
+                if p is None and t not in graph_inputs:
+                    continue
+                self.edges.append((t, p, idx, k))
+        self._prefer_host_shape_math()
+
+    def _open_if(self, k: int, scope: int | None, entry: dict[int, int]) -> None:
+        """Append the entry item of `w.ifs[k]`, executed in `scope`."""
+        f, implicit = self.w.ifs[k]
+        status, why = node_support(f, self.w, self.spec)
+        entry[k] = len(self.items)
+        self.items.append({"name": f.name or f"If_{k}", "op": "If", "inputs": list(implicit), "outputs": [],
+                           "scope": scope, "status": status, "why": why,
+                           "side": HOST if status == "no" else DEVICE})
+
+    def _reads_on(self, idx: int, k: int) -> str | None:
+        """Where item `idx` reads its input `k`: host / device, or None for a dims-only read."""
+        it = self.items[idx]
+        if k in self.spec.get("metadata_inputs", {}).get(it["op"], ()) and it["op"] != "If":
+            return None
+        if it["side"] == HOST or k in self.spec.get("cpu_inputs", {}).get(it["op"], ()):
+            return HOST
+        return DEVICE
+
+    def _prefer_host_shape_math(self) -> None:
+        ops = set(self.spec.get("host_shape_ops", ()))
+        if not ops or self.spec.get("host"):
+            return
+        consumers: dict[int, list[tuple[int, int]]] = {}
+        for _t, p, c, k in self.edges:
+            if p is not None:
+                consumers.setdefault(p, []).append((c, k))
+        outputs = set(self.graph_outputs)
+        changed = True
+        while changed:
+            changed = False
+            for idx, it in enumerate(self.items):
+                if it["side"] != DEVICE or it["op"] not in ops or not it["outputs"]:
+                    continue
+                if any(o in outputs or self.w.elem.get(o) not in INT_ELEMS for o in it["outputs"] if o):
+                    continue
+                reads = [self._reads_on(c, k) for c, k in consumers.get(idx, ())]
+                if reads and all(r != DEVICE for r in reads):
+                    it["side"], it["shape_only"], changed = HOST, True, True
+                    it["why"] = "integer shape arithmetic read on the host"
+
+    def _bytes(self, t: str) -> int | None:
+        shape = self.w.shape.get(t)
+        return None if shape is None else _numel(shape) * _itemsize(self.w.elem.get(t, onnx.TensorProto.FLOAT))
+
+    def report(self) -> dict:
+        items = self.items
+        crossings: dict[tuple[str, str], dict] = {}
+        io = {"in": 0, "out": 0}
+        for t, p, c, k in self.edges:
+            dst = self._reads_on(c, k)
+            if dst is None:
+                continue
+            src = HOST if p is None else items[p]["side"]
+            if src == dst or (p is None and self.spec.get("host")):
+                continue
+            b = self._bytes(t)
+            if p is None:
+                io["in"] += b or 0
+                continue
+            row = crossings.setdefault((t, f"{src}→{dst}"), {
+                "tensor": t, "direction": f"{src}→{dst}", "bytes": b, "dtype": _dtype(self.w.elem.get(t)),
+                "shape": self.w.shape.get(t), "from": items[p]["op"], "to": set()})
+            row["to"].add(items[c]["op"])
+        for o in self.graph_outputs:
+            p = self.producer.get(o)
+            if p is not None and items[p]["side"] == DEVICE and not self.spec.get("host"):
+                io["out"] += self._bytes(o) or 0
+        boundary = sorted(crossings.values(), key=lambda r: (-(r["bytes"] or 0), r["tensor"]))
+        for r in boundary:
+            r["to"] = sorted(r["to"])
+            r["shape"] = list(r["shape"]) if r["shape"] is not None else None
+
+        # Partitions: a node joins the latest partition of its side unless one of its inputs went
+        # through the other side after that partition, so the level of a node is the number of side
+        # switches on its longest input path and every distinct (side, level) is one subgraph.
+        level = [0] * len(items)
+        for t, p, c, k in self.edges:  # edges are in consumer order, producers come first
+            if p is not None:
+                level[c] = max(level[c], level[p] + (items[p]["side"] != items[c]["side"]))
+        groups: dict[tuple[str, int], list[dict]] = {}
+        for it, lv in zip(items, level):
+            groups.setdefault((it["side"], lv), []).append(it)
+        parts = {"device": 0, "host": 0, "host_shape": 0}
+        for (side, _), members in groups.items():
+            members = [it for it in members if not it.get("exit")]  # the If's entry holds its partition
+            if not members:
+                continue
+            if side == DEVICE:
+                parts["device"] += 1
+            elif all(it.get("shape_only") for it in members):
+                parts["host_shape"] += 1
+            else:
+                parts["host"] += 1
+
+        nodes = [it for it in items if not it.get("exit")]  # an If counts once
+        host_ops: dict[str, dict] = {}
+        for it in items:
+            if it["side"] == HOST and not it.get("shape_only") and not it.get("exit"):
+                row = host_ops.setdefault(f"{it['op']}: {it['why'] or 'no kernel'}", {"nodes": 0})
+                row["nodes"] += 1
+        broken = [{"name": it["name"], "op": it["op"], "status": it["status"], "why": it["why"]}
+                  for it in nodes if it["status"] in ("crash", "wrong")]
+        return {"nodes": len(nodes),
+                "device_nodes": sum(it["side"] == DEVICE for it in nodes),
+                "host_nodes": sum(it["side"] == HOST and not it.get("shape_only") for it in nodes),
+                "host_shape_nodes": sum(bool(it.get("shape_only")) for it in nodes),
+                "partitions": parts["device"] + parts["host"], "partition_split": parts,
+                "copy_bytes": sum(r["bytes"] or 0 for r in boundary),
+                "unsized": [r["tensor"] for r in boundary if r["bytes"] is None],
+                "io_bytes": io, "boundary": boundary, "host_ops": host_ops, "broken": broken}
+
+
+def analyze(path: str, bindings: dict, spec: dict) -> dict:
+    model = onnx.load(path, load_external_data=False)
+    w = CostWalk(model, bindings)
+    if w.unbound:
+        raise SystemExit(f"{os.path.basename(path)}: unbound input symbol(s) {sorted(w.unbound)} — "
+                         "pass --bind SYM=N (or --step / --enc-len / --bucket / --frames)")
+    r = Partition(w, model, spec).report()
+    r["name"] = os.path.basename(path)
+    r["symbolic"] = sorted({d.dim_param for i in model.graph.input if i.name not in w.inits
+                            for d in i.type.tensor_type.shape.dim if d.dim_param})
+    return r
+
+
+def print_report(r: dict, ep: str, spec: dict, label: str, top: int) -> None:
+    s = r["partition_split"]
+    print(f"{r['name']} → {ep}  [{label}]  {r['nodes']} nodes")
+    print(f"  on {ep} {r['device_nodes']}  host fallback {r['host_nodes']}  host shape math {r['host_shape_nodes']}")
+    print(f"  partitions {r['partitions']} ({ep} {s['device']}, host {s['host']})"
+          + (f" + {s['host_shape']} host shape-math island(s)" if s["host_shape"] else ""))
+    print(f"  memcpy per run: {len(r['boundary'])} boundary tensor(s) {_fmt(r['copy_bytes'], 'B')}"
+          f"  graph I/O in {_fmt(r['io_bytes']['in'], 'B')}  out {_fmt(r['io_bytes']['out'], 'B')}")
+    for why, row in sorted(r["host_ops"].items(), key=lambda kv: (-kv[1]["nodes"], kv[0])):
+        print(f"    host ×{row['nodes']:<3} {why}")
+    for b in r["boundary"][:top]:
+        size = _fmt(b["bytes"], "B") if b["bytes"] is not None else "?"
+        shape = "×".join(map(str, b["shape"])) if b["shape"] is not None else "?"
+        print(f"    {b['direction']:<13} {size:>10}  {b['dtype']:<7} {shape:<18} {b['from']} → "
+              f"{', '.join(b['to'])}  {b['tensor']}")
+    if len(r["boundary"]) > top:
+        print(f"    … {len(r['boundary']) - top} more boundary tensor(s)")
+    if r["unsized"]:
+        print(f"  WARNING {len(r['unsized'])} boundary tensor(s) with unknown shape (not in the byte total)")
+    if r["symbolic"] and spec.get("static_shapes_for_fusion"):
+        print(f"  note: symbolic input dims ({', '.join(r['symbolic'])}) — {ep} runs its partitions "
+              "op by op instead of fusing them")
+    for b in r["broken"]:
+        print(f"  ERROR {b['status']} on {ep}: {b['op']} {b['name']} — {b['why']}")
+
+
+def main() -> None:
+    ap = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    ap.add_argument("graphs", nargs="+", help="ONNX graphs to partition (weights are not loaded)")
+    ap.add_argument("--ep", default="dml", help="EP entry of the support table (default dml)")
+    ap.add_argument("--table", default=TABLE, help="support table JSON (default: ep_support.json here)")
+    add_binding_args(ap)
+    ap.add_argument("--top", type=int, default=12, help="boundary tensors listed per graph (default 12)")
+    ap.add_argument("--save", metavar="JSON", help="write the partition summary of every graph to JSON")
+    ap.add_argument("--baseline", metavar="JSON",
+                    help="compare against a saved summary; exit 1 if a same-named graph got more "
+                         "partitions, host nodes or copy bytes")
+    ap.add_argument("--max-partitions", type=int, help="fail if any graph has more partitions")
+    ap.add_argument("--max-copy-mb", type=float, help="fail if any graph copies more MB per run")
+    ap.add_argument("--allow-broken", action="store_true", help="do not fail on crash / wrong nodes")
+    args = ap.parse_args()
+    spec = load_table(args.table, args.ep)
+    bindings = bindings_from(args)
+    label = binding_label(bindings)
+
+    reports = []
+    names = [os.path.basename(p) for p in args.graphs]
+    for path, name in zip(args.graphs, names):
+        r = analyze(path, bindings, spec)
+        if names.count(name) > 1:  # same file name from two export dirs: keep them apart
+            r["name"] = os.path.normpath(path)
+        print_report(r, args.ep, spec, label, args.top)
+        reports.append(r)
+
+    keys = ("partitions", "host_nodes", "copy_bytes")
+    summary = {r["name"]: {k: r[k] for k in keys + ("device_nodes", "host_shape_nodes", "io_bytes")}
+               for r in reports}
+    if len(reports) > 1:
+        print(f"\n{'graph':<44} {'parts':>5} {'host':>5} {'copy/run':>11}")
+        for r in reports:
+            print(f"{r['name']:<44} {r['partitions']:>5} {r['host_nodes']:>5} {_fmt(r['copy_bytes'], 'B'):>11}")
+    if args.save:
+        with open(args.save, "w", encoding="utf-8") as f:
+            json.dump({"ep": args.ep, "bindings": bindings, "graphs": summary}, f, indent=1)
+        print(f"saved → {args.save}")
+
+    failures = []
+    for r in reports:
+        if r["broken"] and not args.allow_broken:
+            failures.append(f"{r['name']}: {len(r['broken'])} node(s) that crash / mis-compute on {args.ep}")
+        if args.max_partitions is not None and r["partitions"] > args.max_partitions:
+            failures.append(f"{r['name']}: {r['partitions']} partitions > {args.max_partitions}")
+        if args.max_copy_mb is not None and r["copy_bytes"] > args.max_copy_mb * 1e6:
+            failures.append(f"{r['name']}: {_fmt(r['copy_bytes'], 'B')} copied per run > {args.max_copy_mb} MB")
+    if args.baseline:
+        with open(args.baseline, encoding="utf-8") as f:
+            old = json.load(f)
+        if old.get("ep") != args.ep:
+            raise SystemExit(f"{args.baseline} was saved for EP {old.get('ep')!r}, not {args.ep!r}")
+        for name, row in summary.items():
+            if name not in old["graphs"]:
+                continue
+            for k in keys:
+                if row[k] > old["graphs"][name][k]:
+                    failures.append(f"{name} {k}: {old['graphs'][name][k]} -> {row[k]}")
+        if not failures:
+            print(f"no partition regression vs {args.baseline}")
+    for line in failures:
+        print(f"  FAIL {line}")
+    if failures:
+        raise SystemExit(f"{len(failures)} partition check(s) failed for {args.ep}")
+
+
+if __name__ == "__main__":
+    main()
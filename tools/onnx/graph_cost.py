@@ -0,0 +1,815 @@
+#!/usr/bin/env python3
+"""Static cost of an exported encoder / decoder graph — FLOPs, bytes moved and peak intermediate
+memory per token and per utterance, by op type and by layer. No weights are loaded and nothing runs.
+
+WHY
+---
+The numbers behind the Cohere surgery passes live in docstrings only ("~tens of GFLOP/token",
+"~34 ms/token", "66 s clip 5 ms/tok, 245 s clip 42 ms/tok") and nothing re-measures them. This tool
+prices a graph at concrete symbol bindings (decode step, encoder length, cross bucket), so the source
+export, `_dyn`, the static and the bucketed decoders can be compared side by side, and a saved report
+gates the next export (`--baseline`) before anything is uploaded.
+
+WHAT
+----
+Every graph input gets a concrete shape from the bindings. A forward walk then propagates shapes
+node by node, plus the VALUES of small integer tensors: the shape arithmetic the exports compute
+in-graph (Shape → Gather → Concat → Reshape, Range over the past length, `num_logits_to_keep`), which
+`onnx.shape_inference` leaves unresolved. `com.microsoft` attention ops (MultiHeadAttention,
+GroupQueryAttention, Attention) and MatMulNBits are modeled too. An `If` runs the branch its
+condition selects (`use_cache_branch` = step > 0). Cost model, per node:
+
+  * FLOPs: 2·M·K·N per MatMul / Gemm (batched); 4·B·nh·S·L·hd (+ softmax) per fused attention;
+    2·out·(Cin/g)·k per Conv; 1 per output element for element-wise math and reductions (5 for
+    Softmax, 8 for the LayerNorm / Gelu families); data movement costs none;
+  * bytes: every input read and every output written at its dtype width. Initializer reads are
+    also reported on their own as weight traffic. View ops (Reshape / Squeeze / Unsqueeze /
+    Flatten / Identity) move nothing, and ScatterND writes in place (its updates only);
+  * peak: the largest sum of live intermediates over the node order, where a view shares its
+    source's buffer and graph inputs and weights are excluded.
+
+A decoder's per-UTTERANCE cost over N one-token steps is step 0 plus the trapezoid of steps 1 and
+N-1. That is exact, since every per-step cost is affine in the past length, and step 0 may run a
+different `If` branch. Nodes whose shapes stay unknown (data-dependent ops) are counted and
+listed, never guessed.
+
+Input symbols resolve by name: batch → 1; (decoder_)sequence_length → 1; past_decoder_* / p →
+`--step`; total_sequence_length → step + 1; encoder / enc_* lengths → `--enc-len`; cross_len /
+cross_bucket → `--bucket` (default: the encoder length); n_frames → `--frames`. `--bind SYM=N`
+sets or overrides any symbol.
+
+USAGE
+-----
+    python graph_cost.py <graph.onnx> [<graph.onnx> ...] [--step 0] [--enc-len 375] [--bucket 1024]
+        [--frames 3000] [--tokens 64] [--bind SYM=N ...] [--by op,layer]
+        [--save cost.json] [--baseline cost.json [--tolerance 0.01]]
+
+Graphs are priced at the same bindings and tabulated against the first one (e.g. the source decoder
+then its `_dyn`, static and `_x<B>` outputs).
+"""
+from __future__ import annotations
+
+import argparse
+import json
+import os
+import re
+
+import numpy as np
+import onnx
+from onnx import helper, numpy_helper
+
+VIEW_OPS = {"Reshape", "Squeeze", "Unsqueeze", "Flatten", "Identity"}
+MOVE_OPS = VIEW_OPS | {"Transpose", "Concat", "Split", "Slice", "Gather", "GatherElements", "GatherND",
+                       "ScatterND", "ScatterElements", "Expand", "Tile", "Pad", "Shape", "Size",
+                       "ConstantOfShape", "Constant", "Range", "Cast", "CastLike"}
+BROADCAST_OPS = {"Add", "Sub", "Mul", "Div", "Pow", "Mod", "Max", "Min", "Sum", "Mean", "And", "Or", "Xor",
+                 "Equal", "Less", "Greater", "LessOrEqual", "GreaterOrEqual", "BitShift", "PRelu", "Where"}
+SAME_SHAPE_OPS = {"Relu", "Sigmoid", "Tanh", "Erf", "Exp", "Log", "Sqrt", "Neg", "Abs", "Cast", "CastLike",
+                  "Softmax", "LogSoftmax", "Gelu", "FastGelu", "QuickGelu", "BiasGelu", "Not", "Identity",
+                  "Reciprocal", "Floor", "Ceil", "Round", "Sign", "Sin", "Cos", "Dropout", "IsNaN", "IsInf",
+                  "Clip", "LayerNormalization", "SimplifiedLayerNormalization", "SkipLayerNormalization",
+                  "SkipSimplifiedLayerNormalization", "QuantizeLinear", "DequantizeLinear",
+                  "DynamicQuantizeLinear", "Trilu", "CumSum", "BatchNormalization", "InstanceNormalization",
+                  "GroupNormalization", "RotaryEmbedding", "HardSigmoid", "LeakyRelu", "Elu", "Selu",
+                  "Softplus", "Softsign", "Mish", "HardSwish", "Celu"}
+REDUCE_OPS = {"ReduceSum", "ReduceMean", "ReduceMax", "ReduceMin", "ReduceProd", "ReduceL2",
+              "ReduceSumSquare", "ReduceLogSumExp"}
+FLOPS_PER_ELEM = {"Softmax": 5, "LogSoftmax": 5, "LayerNormalization": 8, "SimplifiedLayerNormalization": 8,
+                  "SkipLayerNormalization": 8, "SkipSimplifiedLayerNormalization": 8, "Gelu": 8,
+                  "FastGelu": 8, "BiasGelu": 8, "QuickGelu": 8, "QuantizeLinear": 2, "DequantizeLinear": 2,
+                  "DynamicQuantizeLinear": 4, "GroupNormalization": 8, "InstanceNormalization": 8,
+                  "BatchNormalization": 4, "RotaryEmbedding": 6}
+VALUE_MAX = 1 << 16  # track the values of tensors up to this many elements (shape arithmetic)
+_NP_BINARY = {"Add": np.add, "Sub": np.subtract, "Mul": np.multiply, "Max": np.maximum, "Min": np.minimum,
+              "Equal": np.equal, "Less": np.less, "Greater": np.greater, "LessOrEqual": np.less_equal,
+              "GreaterOrEqual": np.greater_equal, "And": np.logical_and, "Or": np.logical_or,
+              "Mod": np.mod, "Pow": np.power}
+_LAYER_RES = (re.compile(r"layers?[._/]?(\d+)(?:\b|_|/)"), re.compile(r"\.(\d+)\.(?:decoder|encoder)\."))
+
+
+def _attr(node, name, default=None):
+    for a in node.attribute:
+        if a.name == name:
+            return helper.get_attribute_value(a)
+    return default
+
+
+def _itemsize(elem: int) -> int:
+    try:
+        return np.dtype(helper.tensor_dtype_to_np_dtype(elem)).itemsize
+    except (KeyError, TypeError):
+        return 4
+
+
+def _numel(shape) -> int:
+    return int(np.prod(shape, dtype=np.int64)) if shape is not None else 0
+
+
+def _bcast(*shapes):
+    try:
+        return tuple(np.broadcast_shapes(*[tuple(s) for s in shapes]))
+    except ValueError:
+        return None
+
+
+def _reduced(shape, axes, keepdims: bool):
+    r = len(shape)
+    axes = {a % r for a in axes} if axes is not None and len(axes) else set(range(r))
+    return tuple(1 if k in axes else d for k, d in enumerate(shape) if keepdims or k not in axes)
+
+
+def resolve_symbol(sym: str, b: dict) -> int | None:
+    """Concrete value of an input dim symbol under the CLI bindings (`--bind` wins)."""
+    if sym in b["bind"]:
+        return b["bind"][sym]
+    s = sym.lower()
+    if "batch" in s:
+        return 1
+    if s in ("p",) or s.startswith("past_decoder") or s == "past_sequence_length":
+        return b["step"]
+    if s.startswith("total_sequence"):
+        return b["step"] + 1
+    if s in ("sequence_length", "decoder_sequence_length"):
+        return 1
+    if s in ("cross_len", "cross_bucket"):
+        return b["bucket"] or b["enc_len"]
+    if s.startswith("encoder") or s.startswith("past_encoder") or s.startswith("enc_"):
+        return b["enc_len"]
+    if s in ("n_frames", "num_frames", "feature_length") or "frames" in s:
+        return b["frames"]
+    return None
+
+
+class CostWalk:
+    """One forward pass over a graph at concrete input shapes: per-node shapes, small int values,
+    and the executed node order (the taken `If` branch inlined)."""
+
+    def __init__(self, model, bindings: dict):
+        self.model = model
+        self.b = bindings
+        self.opset = next((o.version for o in model.opset_import if o.domain in ("", "ai.onnx")), 17)
+        self.shape: dict[str, tuple | None] = {}
+        self.val: dict[str, np.ndarray] = {}
+        self.elem: dict[str, int] = {}
+        self.inits: set[str] = set()
+        self.order: list = []  # executed nodes, `If` branches inlined
+        self.scope: list[int | None] = []  # per `order` entry: index into `ifs` of its branch, if any
+        self.ifs: list[tuple] = []  # (If node, implicit inputs: cond + outer tensors its branch reads)
+        self.unresolved: dict[str, int] = {}
+        self.unbound: set[str] = set()
+        g = model.graph
+        for t in g.initializer:
+            self._add_init(t)
+        for vi in g.input:
+            if vi.name in self.inits:
+                continue
+            dims = []
+            for d in vi.type.tensor_type.shape.dim:
+                if d.HasField("dim_value"):
+                    dims.append(d.dim_value)
+                else:
+                    v = resolve_symbol(d.dim_param, bindings)
+                    if v is None:
+                        self.unbound.add(d.dim_param or f"{vi.name}[{len(dims)}]")
+                    dims.append(v or 0)
+            self.shape[vi.name] = tuple(dims)
+            self.elem[vi.name] = vi.type.tensor_type.elem_type
+        # Inputs whose VALUE steers shapes: the logits slice and the merged-decoder branch.
+        if "num_logits_to_keep" in self.shape:
+            self.val["num_logits_to_keep"] = np.array(1, dtype=np.int64).reshape(self.shape["num_logits_to_keep"])
+        if "use_cache_branch" in self.shape:
+            self.val["use_cache_branch"] = np.array([bindings["step"] > 0])
+        self.outputs = {o.name for o in g.output}
+        self._walk(g.node)
+
+    def _add_init(self, t) -> None:
+        self.inits.add(t.name)
+        self.shape[t.name] = tuple(t.dims)
+        self.elem[t.name] = t.data_type
+        external = t.data_location == onnx.TensorProto.EXTERNAL
+        if not external and _numel(t.dims) <= VALUE_MAX:
+            self.val[t.name] = numpy_helper.to_array(t)
+
+    def _walk(self, nodes, scope: int | None = None) -> None:
+        for n in nodes:
+            if n.op_type == "If":
+                cond = self.val.get(n.input[0])
+                if cond is None:
+                    self.unresolved["If"] = self.unresolved.get("If", 0) + 1
+                    continue
+                branch = _attr(n, "then_branch" if bool(np.asarray(cond).reshape(-1)[0]) else "else_branch")
+                for t in branch.initializer:
+                    self._add_init(t)
+                local = {o for b in branch.node for o in b.output} | {t.name for t in branch.initializer}
+                implicit = [n.input[0]] + [i for b in branch.node for i in b.input if i and i not in local]
+                self.ifs.append((n, list(dict.fromkeys(implicit))))
+                self._walk(branch.node, len(self.ifs) - 1)
+                # Branch outputs land on the If outputs: model the hand-off as views.
+                for src, dst in zip([o.name for o in branch.output], n.output):
+                    alias = helper.make_node("Identity", [src], [dst], name=n.name)
+                    self._node(alias, scope)
+                continue
+            self._node(n, scope)
+
+    def _node(self, n, scope: int | None = None) -> None:
+        ins = [self.shape.get(i) if i else None for i in n.input]
+        vals = [self.val.get(i) if i else None for i in n.input]
+        try:
+            outs, ovals = self._infer(n, ins, vals)
+        except (ValueError, IndexError, TypeError, ZeroDivisionError, KeyError, AssertionError):
+            outs, ovals = [None] * len(n.output), [None] * len(n.output)
+        if any(o and s is None for o, s in zip(n.output, outs)):
+            self.unresolved[n.op_type] = self.unresolved.get(n.op_type, 0) + 1
+        elem = self._out_elem(n)
+        for k, o in enumerate(n.output):
+            if not o:
+                continue
+            self.shape[o] = outs[k] if k < len(outs) else None
+            self.elem[o] = elem[k] if k < len(elem) else elem[0]
+            v = ovals[k] if k < len(ovals) else None
+            if v is not None and v.size <= VALUE_MAX:
+                self.val[o] = v
+        self.order.append(n)
+        self.scope.append(scope)
+
+    def _out_elem(self, n) -> list[int]:
+        T = onnx.TensorProto
+        e0 = self.elem.get(n.input[0], T.FLOAT) if n.input else T.FLOAT
+        op = n.op_type
+        if op in ("Shape", "Size", "ArgMax", "ArgMin", "NonZero"):
+            return [T.INT64]
+        if op == "Cast":
+            return [_attr(n, "to")]
+        if op == "CastLike":
+            return [self.elem.get(n.input[1], e0)]
+        if op in ("Equal", "Less", "Greater", "LessOrEqual", "GreaterOrEqual", "Not", "And", "Or", "Xor",
+                  "IsNaN", "IsInf"):
+            return [T.BOOL]
+        if op == "Where":
+            return [self.elem.get(n.input[1], e0)]
+        if op == "TopK":
+            return [e0, T.INT64]
+        if op == "QuantizeLinear":
+            return [self.elem.get(n.input[2], T.UINT8) if len(n.input) > 2 and n.input[2] else T.UINT8]
+        if op == "DequantizeLinear":
+            return [self.elem.get(n.input[1], T.FLOAT)]
+        if op == "DynamicQuantizeLinear":
+            return [T.UINT8, T.FLOAT, T.UINT8]
+        if op == "MatMulInteger":
+            return [T.INT32]
+        if op == "ConstantOfShape":
+            v = _attr(n, "value")
+            return [v.data_type if v is not None else T.FLOAT]
+        if op == "Constant":
+            v = _attr(n, "value")
+            if v is not None:
+                return [v.data_type]
+            return [T.INT64 if _attr(n, "value_int") is not None or _attr(n, "value_ints") else T.FLOAT]
+        return [e0] * max(1, len(n.output))
+
+    # ---- shape (and small-value) rules ------------------------------------------------------------
+    def _infer(self, n, ins, vals):
+        op = n.op_type
+        nout = len(n.output)
+        none = [None] * nout
+        if op == "Constant":
+            t = _attr(n, "value")
+            v = numpy_helper.to_array(t) if t is not None else np.array(
+                next(_attr(n, k) for k in ("value_int", "value_ints", "value_float", "value_floats")
+                     if _attr(n, k) is not None))
+            return [v.shape], [v]
+        if any(s is None for i, s in zip(n.input, ins) if i) and op not in ("If",):
+            return none, none
+        known = all(v is not None for i, v in zip(n.input, vals) if i)
+
+        if op in BROADCAST_OPS:
+            out = _bcast(*[s for i, s in zip(n.input, ins) if i])
+            v = None
+            if known:
+                if op == "Where":
+                    v = np.where(vals[0], vals[1], vals[2])
+                elif op == "Div":
+                    a, b = vals
+                    v = (np.trunc(a / b).astype(a.dtype) if np.issubdtype(a.dtype, np.integer) else a / b)
+                elif op in ("Sum", "Mean"):
+                    v = sum(vals) / (len(vals) if op == "Mean" else 1)
+                elif op in _NP_BINARY:
+                    v = _NP_BINARY[op](*vals) if len(vals) == 2 else None
+            return [out], [v]
+        if op in SAME_SHAPE_OPS:
+            v = None
+            if known and op in ("Cast", "Neg", "Abs", "Identity", "Not", "Floor", "Ceil", "Sign"):
+                a = vals[0]
+                v = {"Cast": lambda: a.astype(helper.tensor_dtype_to_np_dtype(_attr(n, "to"))),
+                     "Neg": lambda: -a, "Abs": lambda: np.abs(a), "Identity": lambda: a,
+                     "Not": lambda: np.logical_not(a), "Floor": lambda: np.floor(a),
+                     "Ceil": lambda: np.ceil(a), "Sign": lambda: np.sign(a)}[op]()
+            outs = [ins[0]] + [None] * (nout - 1)
+            if op in ("SkipLayerNormalization", "SkipSimplifiedLayerNormalization") and nout > 3:
+                outs[3] = ins[0]  # input + skip (+ bias)
+            if op == "DynamicQuantizeLinear":
+                outs = [ins[0], (), ()]
+            if op == "Dropout" and nout > 1:
+                outs[1] = ins[0]
+            return outs, [v] + [None] * (nout - 1)
+
+        if op in ("MatMul", "MatMulInteger", "FusedMatMul", "DynamicQuantizeMatMul", "MatMulIntegerToFloat"):
+            a, b = list(ins[0]), list(ins[1])
+            if op == "FusedMatMul":
+                if _attr(n, "transA", 0):
+                    a[-2:] = a[-2:][::-1]
+                if _attr(n, "transB", 0):
+                    b[-2:] = b[-2:][::-1]
+            a1, b1 = len(a) == 1, len(b) == 1
+            a = [1] + a if a1 else a
+            b = b + [1] if b1 else b
+            out = list(_bcast(a[:-2], b[:-2])) + [a[-2], b[-1]]
+            if a1:
+                out.pop(-2)
+            if b1:
+                out.pop(-1)
+            return [tuple(out)], [None]
+        if op == "MatMulNBits":
+            return [tuple(ins[0][:-1]) + (_attr(n, "N"),)], [None]
+        if op == "Gemm":
+            a, b = ins[0], ins[1]
+            m = a[1] if _attr(n, "transA", 0) else a[0]
+            nn = b[0] if _attr(n, "transB", 0) else b[1]
+            return [(m, nn)], [None]
+        if op == "Conv":
+            x, w = ins[0], ins[1]
+            sp = len(x) - 2
+            k = list(w[2:])
+            strides = _attr(n, "strides", [1] * sp)
+            dil = _attr(n, "dilations", [1] * sp)
+            pads = _attr(n, "pads", [0] * (2 * sp))
+            auto = _attr(n, "auto_pad", b"NOTSET")
+            auto = auto.decode() if isinstance(auto, bytes) else auto
+            out = [x[0], w[0]]
+            for i in range(sp):
+                if auto in ("SAME_UPPER", "SAME_LOWER"):
+                    out.append(-(-x[2 + i] // strides[i]))
+                else:
+                    eff = dil[i] * (k[i] - 1) + 1
+                    out.append((x[2 + i] + pads[i] + pads[i + sp] - eff) // strides[i] + 1)
+            return [tuple(out)], [None]
+
+        if op == "Reshape":
+            if vals[1] is None:
+                return none, none
+            tgt = [int(d) for d in vals[1].reshape(-1)]
+            if not _attr(n, "allowzero", 0):
+                tgt = [ins[0][k] if d == 0 else d for k, d in enumerate(tgt)]
+            if -1 in tgt:
+                rest = _numel([d for d in tgt if d != -1])
+                tgt[tgt.index(-1)] = _numel(ins[0]) // rest if rest else 0
+            v = vals[0].reshape(tgt) if vals[0] is not None else None
+            return [tuple(tgt)], [v]
+        if op == "Flatten":
+            ax = _attr(n, "axis", 1) % (len(ins[0]) or 1)
+            return [(_numel(ins[0][:ax]), _numel(ins[0][ax:]))], [None]
+        if op in ("Squeeze", "Unsqueeze"):
+            axes = _attr(n, "axes")
+            if axes is None and len(n.input) > 1 and n.input[1]:
+                if vals[1] is None:
+                    return none, none
+                axes = [int(a) for a in vals[1].reshape(-1)]
+            s = list(ins[0])
+            if op == "Squeeze":
+                axes = {a % len(s) for a in axes} if axes else {k for k, d in enumerate(s) if d == 1}
+                out = tuple(d for k, d in enumerate(s) if k not in axes)
+            else:
+                r = len(s) + len(axes)
+                for a in sorted(a % r for a in axes):
+                    s.insert(a, 1)
+                out = tuple(s)
+            return [out], [vals[0].reshape(out) if vals[0] is not None else None]
+        if op == "Transpose":
+            perm = _attr(n, "perm") or list(range(len(ins[0])))[::-1]
+            v = np.transpose(vals[0], perm) if vals[0] is not None else None
+            return [tuple(ins[0][p] for p in perm)], [v]
+        if op == "Concat":
+            ax = _attr(n, "axis") % len(ins[0])
+            out = list(ins[0])
+            out[ax] = sum(s[ax] for i, s in zip(n.input, ins) if i)
+            v = np.concatenate([v for i, v in zip(n.input, vals) if i], axis=ax) if known else None
+            return [tuple(out)], [v]
+        if op == "Split":
+            ax = _attr(n, "axis", 0) % len(ins[0])
+            split = _attr(n, "split")
+            if split is None and len(n.input) > 1 and n.input[1]:
+                split = [int(x) for x in vals[1].reshape(-1)] if vals[1] is not None else None
+            if split is None:
+                d = ins[0][ax]
+                per = -(-d // nout)
+                split = [per] * (nout - 1) + [d - per * (nout - 1)]
+            outs = []
+            for sz in split:
+                s = list(ins[0])
+                s[ax] = sz
+                outs.append(tuple(s))
+            return outs, [None] * nout
+        if op == "Slice":
+            if self.opset < 10:
+                starts, ends = _attr(n, "starts"), _attr(n, "ends")
+                axes, steps = _attr(n, "axes"), None
+            else:
+                if vals[1] is None or vals[2] is None:
+                    return none, none
+                starts, ends = vals[1].reshape(-1).tolist(), vals[2].reshape(-1).tolist()
+                axes = vals[3].reshape(-1).tolist() if len(n.input) > 3 and n.input[3] else None
+                steps = vals[4].reshape(-1).tolist() if len(n.input) > 4 and n.input[4] else None
+                if (len(n.input) > 3 and n.input[3] and axes is None) or \
+                        (len(n.input) > 4 and n.input[4] and steps is None):
+                    return none, none
+            r = len(ins[0])
+            axes = [a % r for a in (axes or range(len(starts)))]
+            steps = steps or [1] * len(starts)
+            idx = [slice(None)] * r
+            out = list(ins[0])
+            for a, s0, e0, st in zip(axes, starts, ends, steps):
+                sl = slice(int(s0), int(e0), int(st))
+                idx[a] = sl
+                out[a] = len(range(*sl.indices(ins[0][a])))
+            v = vals[0][tuple(idx)] if vals[0] is not None else None
+            return [tuple(out)], [v]
+        if op == "Gather":
+            ax = _attr(n, "axis", 0) % len(ins[0])
+            out = tuple(ins[0][:ax]) + tuple(ins[1]) + tuple(ins[0][ax + 1:])
+            v = np.take(vals[0], vals[1].astype(np.int64), axis=ax) if known else None
+            return [out], [v]
+        if op == "GatherElements":
+            return [tuple(ins[1])], [None]
+        if op == "GatherND":
+            bd = _attr(n, "batch_dims", 0)
+            return [tuple(ins[1][:-1]) + tuple(ins[0][bd + ins[1][-1]:])], [None]
+        if op in ("ScatterND", "ScatterElements"):
+            return [ins[0]], [None]
+        if op == "Expand":
+            if vals[1] is None:
+                return none, none
+            out = _bcast(ins[0], tuple(int(d) for d in vals[1].reshape(-1)))
+            v = np.broadcast_to(vals[0], out).copy() if vals[0] is not None and _numel(out) <= VALUE_MAX else None
+            return [out], [v]
+        if op == "Tile":
+            if vals[1] is None:
+                return none, none
+            reps = vals[1].reshape(-1).tolist()
+            return [tuple(d * int(r) for d, r in zip(ins[0], reps))], [None]
+        if op == "Pad":
+            pads = _attr(n, "pads") if self.opset < 11 else (vals[1].reshape(-1).tolist()
+                                                              if vals[1] is not None else None)
+            if pads is None:
+                return none, none
+            r = len(ins[0])
+            axes = list(range(r))
+            if len(n.input) > 3 and n.input[3]:
+                if vals[3] is None:
+                    return none, none
+                axes = [a % r for a in vals[3].reshape(-1).tolist()]
+            out = list(ins[0])
+            for k, a in enumerate(axes):
+                out[a] += int(pads[k]) + int(pads[k + len(axes)])
+            return [tuple(out)], [None]
+        if op == "Shape":
+            s = ins[0]
+            start, end = _attr(n, "start", 0), _attr(n, "end", len(s))
+            v = np.array(s[start:end], dtype=np.int64)
+            return [v.shape], [v]
+        if op == "Size":
+            return [()], [np.array(_numel(ins[0]), dtype=np.int64)]
+        if op == "ConstantOfShape":
+            if vals[0] is None:
+                return none, none
+            shp = tuple(int(d) for d in vals[0].reshape(-1))
+            t = _attr(n, "value")
+            fill = numpy_helper.to_array(t).reshape(-1)[0] if t is not None else np.float32(0)
+            v = np.full(shp, fill) if _numel(shp) <= VALUE_MAX else None
+            return [shp], [v]
+        if op == "Range":
+            if not known:
+                return none, none
+            v = np.arange(vals[0].item(), vals[1].item(), vals[2].item(), dtype=vals[0].dtype)
+            return [v.shape], [v]
+        if op in REDUCE_OPS:
+            axes = _attr(n, "axes")
+            if axes is None and len(n.input) > 1 and n.input[1]:
+                if vals[1] is None:
+                    return none, none
+                axes = vals[1].reshape(-1).tolist()
+            if not axes and _attr(n, "noop_with_empty_axes", 0):
+                return [ins[0]], [vals[0]]
+            keep = bool(_attr(n, "keepdims", 1))
+            out = _reduced(ins[0], axes, keep)
+            v = None
+            if vals[0] is not None and op in ("ReduceSum", "ReduceMax", "ReduceMin", "ReduceProd"):
+                fn = {"ReduceSum": np.sum, "ReduceMax": np.max, "ReduceMin": np.min, "ReduceProd": np.prod}[op]
+                v = fn(vals[0], axis=tuple(axes) if axes else None, keepdims=keep)
+            return [out], [np.asarray(v) if v is not None else None]
+        if op in ("ArgMax", "ArgMin"):
+            return [_reduced(ins[0], [_attr(n, "axis", 0)], bool(_attr(n, "keepdims", 1)))], [None]
+        if op == "TopK":
+            if vals[1] is None:
+                return none, none
+            ax = _attr(n, "axis", -1) % len(ins[0])
+            out = list(ins[0])
+            out[ax] = int(vals[1].reshape(-1)[0])
+            return [tuple(out)] * 2, [None, None]
+
+        # ---- com.microsoft attention ------------------------------------------------------------
+        if op == "MultiHeadAttention":
+            nh = _attr(n, "num_heads")
+            q = ins[0]
+            k = ins[1] if len(n.input) > 1 and n.input[1] else None
+            v = ins[2] if len(n.input) > 2 and n.input[2] else None
+            past = ins[6] if len(n.input) > 6 and n.input[6] else None
+            hd = q[2] // nh
+            kv_len = (k[2] if len(k) == 4 else k[1]) if k is not None else q[1]
+            dv = (v[1] * v[3] if len(v) == 4 else v[2]) if v is not None else q[2]
+            total = kv_len + (past[2] if past is not None and len(k or ()) != 4 else 0)
+            present = (q[0], nh, total, hd)
+            return [(q[0], q[1], dv), present, present][:nout], none
+        if op == "GroupQueryAttention":
+            nh, kvh = _attr(n, "num_heads"), _attr(n, "kv_num_heads")
+            q = ins[0]
+            packed = not (len(n.input) > 1 and n.input[1])
+            hd = q[2] // (nh + 2 * kvh) if packed else ins[1][2] // kvh
+            past = ins[3] if len(n.input) > 3 and n.input[3] else None
+            p_len = past[2] if past is not None else 0
+            tot = vals[6] if len(n.input) > 6 and n.input[6] else None
+            total = int(np.asarray(tot).reshape(-1)[0]) if tot is not None else p_len + q[1]
+            present = (q[0], kvh, max(p_len, total), hd)
+            return [(q[0], q[1], nh * hd), present, present][:nout], none
+        if op == "Attention":
+            nh = _attr(n, "num_heads")
+            x, w = ins[0], ins[1]
+            hidden = w[1] // 3
+            past = ins[4] if len(n.input) > 4 and n.input[4] else None
+            total = x[1] + (past[3] if past is not None else 0)
+            return [(x[0], x[1], hidden), (2, x[0], nh, total, hidden // nh)][:nout], none
+        return none, none
+
+    # ---- cost --------------------------------------------------------------------------------------
+    def _bytes(self, name: str) -> int:
+        return _numel(self.shape.get(name)) * _itemsize(self.elem.get(name, 1))
+
+    def node_flops(self, n) -> int:
+        op = n.op_type
+        if op in MOVE_OPS or self.shape.get(n.output[0]) is None:
+            return 0
+        out = self.shape[n.output[0]]
+        if op in ("MatMul", "MatMulInteger", "FusedMatMul", "DynamicQuantizeMatMul", "MatMulIntegerToFloat"):
+            a = self.shape[n.input[0]]
+            k = a[-2] if op == "FusedMatMul" and _attr(n, "transA", 0) else a[-1]
+            return 2 * _numel(out) * k
+        if op == "MatMulNBits":
+            return 2 * _numel(out) * _attr(n, "K")
+        if op == "Gemm":
+            a = self.shape[n.input[0]]
+            return 2 * _numel(out) * (a[0] if _attr(n, "transA", 0) else a[1])
+        if op == "Conv":
+            w = self.shape[n.input[1]]
+            return 2 * _numel(out) * _numel(w[1:])
+        if op in ("MultiHeadAttention", "GroupQueryAttention", "Attention"):
+            q = self.shape[n.input[0]]
+            nh = _attr(n, "num_heads")
+            if op == "Attention":
+                present = self.shape.get(n.output[1]) if len(n.output) > 1 and n.output[1] else None
+                length = present[3] if present else q[1]
+                hd = out[2] // nh
+                proj = 2 * q[0] * q[1] * q[2] * self.shape[n.input[1]][1]
+                return proj + q[0] * nh * q[1] * length * (4 * hd + 5)
+            present = self.shape.get(n.output[1]) if len(n.output) > 1 and n.output[1] else None
+            if op == "GroupQueryAttention":
+                tot = self.val.get(n.input[6]) if len(n.input) > 6 and n.input[6] else None
+                length = int(np.asarray(tot).reshape(-1)[0]) if tot is not None else (present or q)[-2]
+            elif present is not None:
+                length = present[2]
+            else:
+                k = self.shape[n.input[1]]
+                length = k[2] if len(k) == 4 else k[1]
+            hd = out[2] // nh
+            return q[0] * nh * q[1] * length * (4 * hd + 5)
+        if op in REDUCE_OPS:
+            return _numel(self.shape[n.input[0]])
+        return FLOPS_PER_ELEM.get(op, 1) * _numel(out)
+
+    def node_bytes(self, n) -> tuple[int, int, int]:
+        """(read, written, of which read from initializers)."""
+        op = n.op_type
+        if op in VIEW_OPS or op in ("Shape", "Size", "Constant"):
+            return 0, 0, 0
+        reads = list(dict.fromkeys(i for i in n.input if i))
+        if op == "ScatterND":  # in place over its data input: only the updates move
+            reads = reads[1:]
+            upd = self._bytes(n.input[2])
+            return sum(self._bytes(i) for i in reads), upd, 0
+        written = sum(self._bytes(o) for o in n.output if o)
+        if op in ("Gather", "GatherElements", "GatherND", "Slice"):  # only the picked rows are read
+            data = min(self._bytes(n.input[0]), written)
+            rest = sum(self._bytes(i) for i in reads[1:])
+            return data + rest, written, data if n.input[0] in self.inits else 0
+        rd = sum(self._bytes(i) for i in reads)
+        wt = sum(self._bytes(i) for i in reads if i in self.inits)
+        return rd, written, wt
+
+    def peak_bytes(self) -> int:
+        """Largest live-intermediate total over the executed order (views share their source)."""
+        root: dict[str, str] = {}
+        for n in self.order:
+            for o in n.output:
+                if o:
+                    root[o] = root.get(n.input[0], n.input[0]) if n.op_type in VIEW_OPS and n.input else o
+        last: dict[str, int] = {}
+        for k, n in enumerate(self.order):
+            for i in n.input:
+                if i in root:
+                    last[root[i]] = k
+        for o in self.outputs:
+            if o in root:
+                last[root[o]] = len(self.order)
+        live = peak = 0
+        size: dict[str, int] = {}
+        for k, n in enumerate(self.order):
+            for o in n.output:
+                if o and root.get(o) == o and o not in self.inits:
+                    size[o] = self._bytes(o)
+                    live += size[o]
+            peak = max(peak, live)
+            for i in set(n.input) | set(n.output):
+                r = root.get(i)
+                if r in size and last.get(r, k) <= k:
+                    live -= size.pop(r)
+        return peak
+
+
+def layer_of_name(text: str) -> str | None:
+    """Decoder / encoder layer index named in a node or tensor name (`layers.3`, `.3.decoder.`)."""
+    for rx in _LAYER_RES:
+        m = rx.search(text)
+        if m:
+            return m.group(1)
+    return None
+
+
+def layer_of(n) -> str:
+    return next((k for k in map(layer_of_name, [n.name] + list(n.output) + list(n.input)) if k), "-")
+
+
+def analyze(path: str, bindings: dict) -> dict:
+    """Cost report of one graph at `bindings`: totals, per op type, per layer, unresolved nodes."""
+    model = onnx.load(path, load_external_data=False)
+    w = CostWalk(model, bindings)
+    if w.unbound:
+        raise SystemExit(f"{os.path.basename(path)}: unbound input symbol(s) {sorted(w.unbound)} — "
+                         "pass --bind SYM=N (or --step / --enc-len / --bucket / --frames)")
+    tot = {"flops": 0, "read": 0, "written": 0, "weights": 0}
+    by_op: dict[str, dict[str, int]] = {}
+    by_layer: dict[str, dict[str, int]] = {}
+    for n in w.order:
+        f = w.node_flops(n)
+        rd, wr, wt = w.node_bytes(n)
+        for key, table in ((n.op_type, by_op), (layer_of(n), by_layer)):
+            row = table.setdefault(key, {"nodes": 0, "flops": 0, "read": 0, "written": 0})
+            row["nodes"] += 1
+            row["flops"] += f
+            row["read"] += rd
+            row["written"] += wr
+        tot["flops"] += f
+        tot["read"] += rd
+        tot["written"] += wr
+        tot["weights"] += wt
+    tot["peak"] = w.peak_bytes()
+    return {"name": os.path.basename(path), "nodes": len(w.order), "totals": tot, "by_op": by_op,
+            "by_layer": by_layer, "unresolved": w.unresolved,
+            "decoder": any(i.name == "input_ids" for i in model.graph.input)}
+
+
+def utterance(path: str, bindings: dict, tokens: int) -> dict:
+    """Summed decoder cost over `tokens` one-token steps: step 0 + trapezoid(step 1, step N-1)."""
+    at = lambda s: analyze(path, dict(bindings, step=s))["totals"]  # noqa: E731
+    c0 = at(0)
+    if tokens <= 1:
+        return dict(c0)
+    c1, cn = at(1), at(tokens - 1)
+    out = {k: c0[k] + (tokens - 1) * (c1[k] + cn[k]) // 2 for k in ("flops", "read", "written", "weights")}
+    out["peak"] = max(c0["peak"], c1["peak"], cn["peak"])
+    return out
+
+
+def _fmt(n: float, unit: str) -> str:
+    for scale, p in ((1e12, "T"), (1e9, "G"), (1e6, "M"), (1e3, "k")):
+        if abs(n) >= scale:
+            return f"{n / scale:.2f} {p}{unit}"
+    return f"{n:.0f} {unit}"
+
+
+def print_report(r: dict, by: set[str], label: str) -> None:
+    t = r["totals"]
+    unres = ", ".join(f"{op}×{c}" for op, c in sorted(r["unresolved"].items()))
+    print(f"{r['name']}  [{label}]  {r['nodes']} nodes" + (f"  (unresolved: {unres})" if unres else ""))
+    print(f"  {_fmt(t['flops'], 'FLOP')}  read {_fmt(t['read'], 'B')} (weights {_fmt(t['weights'], 'B')})"
+          f"  written {_fmt(t['written'], 'B')}  peak {_fmt(t['peak'], 'B')}")
+    if "utterance" in r:
+        u = r["utterance"]
+        print(f"  per utterance ({r['tokens']} tokens): {_fmt(u['flops'], 'FLOP')}  read {_fmt(u['read'], 'B')}"
+              f"  written {_fmt(u['written'], 'B')}  peak {_fmt(u['peak'], 'B')}")
+    for key, title in (("by_op", "op"), ("by_layer", "layer")):
+        if title not in by:
+            continue
+        rows = sorted(r[key].items(), key=lambda kv: (-kv[1]["flops"], -kv[1]["read"], kv[0]))
+        if key == "by_layer":
+            rows = sorted(r[key].items(), key=lambda kv: (kv[0] == "-", int(kv[0]) if kv[0].isdigit() else 0))
+        print(f"    {title:<34} {'nodes':>5} {'FLOPs':>12} {'read':>11} {'written':>11}")
+        for name, row in rows:
+            print(f"    {name:<34} {row['nodes']:>5} {_fmt(row['flops'], 'F'):>12} {_fmt(row['read'], 'B'):>11} "
+                  f"{_fmt(row['written'], 'B'):>11}")
+
+
+def add_binding_args(ap: argparse.ArgumentParser) -> None:
+    """The symbol-binding flags shared by the static graph tools (`ep_partition.py` reuses them)."""
+    ap.add_argument("--step", type=int, default=0, help="decode step = past length (default 0)")
+    ap.add_argument("--enc-len", type=int, default=375, help="encoder output length (default 375)")
+    ap.add_argument("--bucket", type=int, default=0, help="cross bucket length (default: --enc-len)")
+    ap.add_argument("--frames", type=int, default=3000, help="encoder input frames (default 3000)")
+    ap.add_argument("--bind", action="append", default=[], metavar="SYM=N",
+                    help="bind (or override) an input dim symbol; repeatable")
+
+
+def bindings_from(args) -> dict:
+    bind = {}
+    for b in args.bind:
+        k, _, v = b.partition("=")
+        if not v.lstrip("-").isdigit():
+            raise SystemExit(f"--bind expects SYM=N, got {b!r}")
+        bind[k] = int(v)
+    return {"step": args.step, "enc_len": args.enc_len, "bucket": args.bucket, "frames": args.frames, "bind": bind}
+
+
+def binding_label(b: dict) -> str:
+    return f"step {b['step']}, enc {b['enc_len']}, bucket {b['bucket'] or b['enc_len']}, frames {b['frames']}"
+
+
+def main() -> None:
+    ap = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    ap.add_argument("graphs", nargs="+", help="ONNX graphs to price (weights are not loaded)")
+    add_binding_args(ap)
+    ap.add_argument("--tokens", type=int, default=0,
+                    help="also sum each decoder over this many one-token steps (per-utterance cost)")
+    ap.add_argument("--by", default="op,layer", help="breakdowns to print: op, layer, both or none")
+    ap.add_argument("--save", metavar="JSON", help="write the totals of every graph to JSON")
+    ap.add_argument("--baseline", metavar="JSON",
+                    help="compare against a saved report; exit 1 if a same-named graph costs more")
+    ap.add_argument("--tolerance", type=float, default=0.01,
+                    help="relative growth allowed against --baseline (default 0.01)")
+    args = ap.parse_args()
+    bindings = bindings_from(args)
+    by = {b.strip() for b in args.by.split(",")}
+    label = binding_label(bindings)
+
+    reports = []
+    names = [os.path.basename(p) for p in args.graphs]
+    for path, name in zip(args.graphs, names):
+        r = analyze(path, bindings)
+        if names.count(name) > 1:  # same file name from two export dirs: keep them apart
+            r["name"] = os.path.normpath(path)
+        if r["decoder"] and args.tokens:
+            r["tokens"] = args.tokens
+            r["utterance"] = utterance(path, bindings, args.tokens)
+        print_report(r, by, label)
+        reports.append(r)
+
+    if len(reports) > 1:
+        base = reports[0]["totals"]
+        print(f"\n{'graph':<44} {'FLOPs':>12} {'read':>11} {'written':>11} {'peak':>11}  vs first (FLOPs / read)")
+        for r in reports:
+            t = r["totals"]
+            rel = " / ".join(f"{t[k] / base[k]:.2f}x" if base[k] else "-" for k in ("flops", "read"))
+            print(f"{r['name']:<44} {_fmt(t['flops'], 'F'):>12} {_fmt(t['read'], 'B'):>11} "
+                  f"{_fmt(t['written'], 'B'):>11} {_fmt(t['peak'], 'B'):>11}  {rel}")
+
+    summary = {r["name"]: dict(r["totals"], **({"utterance": r["utterance"]} if "utterance" in r else {}))
+               for r in reports}
+    if args.save:
+        with open(args.save, "w", encoding="utf-8") as f:
+            json.dump({"bindings": {k: v for k, v in bindings.items()}, "graphs": summary}, f, indent=1)
+        print(f"saved → {args.save}")
+    if args.baseline:
+        with open(args.baseline, encoding="utf-8") as f:
+            old = json.load(f)["graphs"]
+        worse = []
+        for name, t in summary.items():
+            if name not in old:
+                continue
+            for k in ("flops", "read", "written", "peak"):
+                if t[k] > old[name][k] * (1 + args.tolerance) and t[k] - old[name][k] > 0:
+                    worse.append(f"{name} {k}: {_fmt(old[name][k], '')} -> {_fmt(t[k], '')}")
+        for line in worse:
+            print(f"  REGRESSION {line}")
+        if worse:
+            raise SystemExit(f"{len(worse)} cost regression(s) above {args.tolerance:.0%} vs {args.baseline}")
+        print(f"no cost regression vs {args.baseline} (tolerance {args.tolerance:.0%})")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,204 @@
+"""Indexed view of an ONNX graph for the Cohere surgery passes (`cohere_decompose_attention.py`,
+`cohere_inject_cross_bias.py`).
+
+The passes used to re-derive graph structure from scratch — a fresh `{output: node}` dict per pass,
+`next(n for n in g.node if name in n.output)` per rewired tensor, a depth-bounded recursive walk
+with a new `seen` set per query, and a full list filter + `.index()` + producer rebuild after every
+spliced Add chain. Each is linear, so a pass doing one per layer is quadratic in the node count.
+`GraphIndex` builds the producer / consumer / initializer / value_info maps ONCE, keeps them current
+as nodes are added, removed or rewired, and writes the result back in ONE topological pass:
+
+    gi = GraphIndex(g)
+    prod = gi.producer("present.0.decoder.key")
+    gi.remove(prod)
+    gi.add(helper.make_node("Concat", [...], ["present.0.decoder.key"], axis=2))
+    gi.rename_uses("old_out", "new_out")
+    gi.commit()                           # g.node := stable topological order of the live nodes
+
+Edits go through the index until `commit()`. Node order is not tracked while editing — new nodes
+are simply registered — and `commit()` emits a topological order that keeps the original relative
+order wherever the dependencies allow, so a pass never has to work out an insertion point.
+
+Proto-only, like the passes: initializers are indexed by name and never read.
+"""
+from __future__ import annotations
+
+import heapq
+
+import onnx
+
+
+def node_reads(n) -> set[str]:
+    """Every tensor name a node reads, including outer-scope names referenced from its subgraphs
+    (If/Loop bodies may consume parent initializers without listing them as node inputs)."""
+    reads = {i for i in n.input if i}
+    for a in n.attribute:
+        subs = [a.g] if a.type == onnx.AttributeProto.GRAPH else list(a.graphs)
+        for sg in subs:
+            for sn in sg.node:
+                reads |= node_reads(sn)
+    return reads
+
+
+class GraphIndex:
+    """Producer / consumer / initializer / value_info index over one `GraphProto`, updated
+    incrementally by `add` / `remove` / `set_input` / `set_output` / `rename_uses`.
+
+    Consumers are DIRECT node inputs (what `set_input` / `rename_uses` can rewrite); subgraph reads
+    only matter for ordering and are resolved at `commit()`."""
+
+    def __init__(self, g):
+        self.g = g
+        self._seq = 0
+        self._nodes: dict[int, tuple[int, onnx.NodeProto]] = {}
+        self._producer: dict[str, onnx.NodeProto] = {}
+        self._consumers: dict[str, dict[int, onnx.NodeProto]] = {}
+        self.inits = {t.name: t for t in g.initializer}
+        self.inputs = {vi.name: vi for vi in g.input}
+        self.outputs = {vi.name: vi for vi in g.output}
+        self.value_info = {vi.name: vi for vi in g.value_info}
+        for n in g.node:
+            self._register(n)
+
+    # ---- queries ---------------------------------------------------------------------------------
+    def __len__(self) -> int:
+        return len(self._nodes)
+
+    def nodes(self) -> list:
+        """Live nodes in original-then-insertion order (NOT necessarily topological before commit)."""
+        return [n for _, n in sorted(self._nodes.values(), key=lambda sn: sn[0])]
+
+    def of_type(self, op_type: str) -> list:
+        return [n for n in self.nodes() if n.op_type == op_type]
+
+    def producer(self, name: str):
+        """The node producing tensor `name`, or None (graph input / initializer / unknown)."""
+        return self._producer.get(name)
+
+    def consumers(self, name: str) -> list:
+        return list(self._consumers.get(name, {}).values())
+
+    def is_graph_output(self, name: str) -> bool:
+        return name in self.outputs
+
+    def vi(self, name: str):
+        """Declared ValueInfoProto for `name` (graph input, output, or value_info), or None."""
+        return self.inputs.get(name) or self.outputs.get(name) or self.value_info.get(name)
+
+    def upstream_has(self, name: str, op_types, memo: dict[str, bool]) -> bool:
+        """True if any node in the producer cone of `name` has an op in `op_types`. Iterative and
+        memoized in `memo` (caller-owned: reuse it across queries while the cone is unchanged), so
+        a batch of queries over one graph costs O(nodes) in total instead of O(nodes) each."""
+        if name in memo:
+            return memo[name]
+        stack = [(name, False)]
+        while stack:
+            t, expanded = stack.pop()
+            if t in memo:
+                continue
+            n = self._producer.get(t)
+            if n is None:
+                memo[t] = False
+            elif n.op_type in op_types:
+                memo[t] = True
+            elif expanded:
+                memo[t] = any(memo.get(i, False) for i in n.input if i)
+            else:
+                stack.append((t, True))
+                stack.extend((i, False) for i in n.input if i and i not in memo)
+        return memo[name]
+
+    # ---- edits -----------------------------------------------------------------------------------
+    def _register(self, n) -> None:
+        self._nodes[id(n)] = (self._seq, n)
+        self._seq += 1
+        for o in n.output:
+            if o:
+                self._producer[o] = n
+        for i in n.input:
+            if i:
+                self._consumers.setdefault(i, {})[id(n)] = n
+
+    def add(self, *nodes) -> None:
+        for n in nodes:
+            for o in n.output:
+                if o and o in self._producer:
+                    raise SystemExit(f"graph index: {o!r} already has a producer "
+                                     f"({self._producer[o].op_type} {self._producer[o].name!r})")
+            self._register(n)
+
+    def remove(self, *nodes) -> None:
+        for n in nodes:
+            if self._nodes.pop(id(n), None) is None:
+                continue
+            for o in n.output:
+                if self._producer.get(o) is n:
+                    del self._producer[o]
+            for i in n.input:
+                self._consumers.get(i, {}).pop(id(n), None)
+
+    def set_input(self, n, k: int, name: str) -> None:
+        old = n.input[k]
+        n.input[k] = name
+        if old and old not in n.input:
+            self._consumers.get(old, {}).pop(id(n), None)
+        if name:
+            self._consumers.setdefault(name, {})[id(n)] = n
+
+    def set_output(self, n, k: int, name: str) -> None:
+        old = n.output[k]
+        if self._producer.get(old) is n:
+            del self._producer[old]
+        n.output[k] = name
+        if name:
+            self._producer[name] = n
+
+    def rename_uses(self, old: str, new: str) -> int:
+        """Point every direct reader of `old` at `new`; returns the number of nodes rewired."""
+        readers = self.consumers(old)
+        for n in readers:
+            for k, i in enumerate(n.input):
+                if i == old:
+                    n.input[k] = new
+            self._consumers.setdefault(new, {})[id(n)] = n
+        self._consumers.pop(old, None)
+        return len(readers)
+
+    # ---- write-back ------------------------------------------------------------------------------
+    def topo_order(self) -> list:
+        """Stable topological order of the live nodes (Kahn's algorithm, ties broken by original /
+        insertion sequence). Names nothing live produces — graph inputs, initializers, outer-scope
+        names — are ready from the start."""
+        entries = sorted(self._nodes.values(), key=lambda sn: sn[0])
+        indeg: dict[int, int] = {}
+        waiting: dict[str, list[tuple[int, onnx.NodeProto]]] = {}
+        heap = []
+        for seq, n in entries:
+            deps = {t for t in node_reads(n) if t in self._producer and self._producer[t] is not n}
+            indeg[id(n)] = len(deps)
+            for t in deps:
+                waiting.setdefault(t, []).append((seq, n))
+            if not deps:
+                heap.append((seq, id(n), n))
+        heapq.heapify(heap)
+        order = []
+        while heap:
+            _, _, n = heapq.heappop(heap)
+            order.append(n)
+            for o in n.output:
+                for seq, c in waiting.pop(o, ()):
+                    indeg[id(c)] -= 1
+                    if not indeg[id(c)]:
+                        heapq.heappush(heap, (seq, id(c), c))
+        if len(order) != len(entries):
+            stuck = sorted({n.op_type for _, n in entries if indeg[id(n)]})
+            raise SystemExit(f"graph index: cycle among {len(entries) - len(order)} node(s) ({stuck[:4]})")
+        return order
+
+    def commit(self) -> None:
+        """Write the live nodes back to the graph in topological order, then re-index the written
+        nodes (protobuf copies on `extend`, so the old node objects are detached afterwards)."""
+        order = self.topo_order()
+        del self.g.node[:]
+        self.g.node.extend(order)
+        self.__init__(self.g)
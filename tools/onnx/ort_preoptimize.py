@@ -0,0 +1,233 @@
+#!/usr/bin/env python3
+"""Write pre-optimized ORT artifacts (optimized `.onnx` and/or `.ort` format) of exported graphs,
+prove they compute the same thing, and benchmark cold session creation raw vs pre-optimized.
+
+WHY
+---
+The app creates its ORT sessions on the shipped `.onnx` graphs, so every launch and every model
+switch pays ORT's graph optimization again: constant folding, the contrib fusions and the layout
+transforms of a large decoder plus encoder, all before the first transcription. ORT can save the
+graph it ends up with (`optimized_model_filepath`), either as ONNX or in its own flatbuffer format.
+Loaded with optimizations disabled, such an artifact skips that work.
+
+WHAT
+----
+Per graph and per TARGET `<ep>-<level>`:
+
+  * `any-basic`: ORT's basic level only (constant folding, redundant-node elimination). These
+    rewrites are EP-independent, so the result is still a plain graph any EP (DirectML included) can
+    partition and optimize further;
+  * `cpu-extended`: adds the CPU EP's contrib fusions (FusedMatMul, attention / LayerNorm fusions);
+    CPU sessions only;
+  * `cpu-all`: adds the NCHWc / layout transforms, which are tied to the writing machine's ISA. Only
+    ship these to matching hardware.
+
+DirectML (and any EP that compiles its partitions) cannot be pre-optimized offline: its fused
+kernels are built at session creation and are not serializable. Asking for `dml-*` exits with a
+pointer to `any-basic`.
+
+Each target is written as `<stem>.<target>.onnx` (with its own `<stem>.<target>.onnx_data`
+sidecar, since constant folding changes the initializers) and/or `<stem>.<target>.ort` (weights
+embedded). Both are exact-name misses for the engine's globs, so they never shadow the graphs
+it loads today. An `.onnx` artifact is stamped `winstt_ort_preoptimized=<target>;ort=<version>`:
+ORT artifacts are only guaranteed to load in the ORT version that wrote them.
+
+VERIFY
+------
+The raw graph (session at the target level) and the artifact (session with optimizations disabled)
+get identical feeds. Input shapes come from `graph_cost.resolve_symbol` bindings, floats are random,
+ints / bools are ones (always in range). Every output must match BIT-EXACTLY, since the artifact is
+the very graph the raw session runs. Any difference fails the run.
+
+The cold-start benchmark then times `--repeats` session creations and the first run after each,
+raw at the target level vs the artifact with optimizations disabled, and reports medians.
+
+USAGE
+-----
+    python ort_preoptimize.py <graph.onnx | onnx_dir> [...] [--targets any-basic,cpu-extended]
+        [--formats onnx,ort] [--out-dir DIR] [--repeats 3] [--no-check]
+
+A directory means every `*.onnx` in it that is not already an artifact. The converter runs this on
+its outputs with `--preoptimize any-basic,cpu-extended`.
+"""
+from __future__ import annotations
+
+import argparse
+import glob
+import os
+import re
+import time
+
+import numpy as np
+import onnx
+import onnxruntime as ort
+
+from cohere_decompose_attention import _set_meta
+from graph_cost import resolve_symbol
+
+LEVELS = {"basic": ort.GraphOptimizationLevel.ORT_ENABLE_BASIC,
+          "extended": ort.GraphOptimizationLevel.ORT_ENABLE_EXTENDED,
+          "all": ort.GraphOptimizationLevel.ORT_ENABLE_ALL}
+EP_LEVELS = {"any": ("basic",), "cpu": ("basic", "extended", "all")}
+FORMATS = ("onnx", "ort")
+ARTIFACT_RE = re.compile(r"\.(any|cpu)-(basic|extended|all)\.(onnx|ort)$")
+# Parity feeds: a short decode step against a short clip (every shape symbol must resolve).
+PARITY_BINDINGS = {"step": 3, "enc_len": 16, "bucket": 0, "frames": 128, "bind": {}}
+
+
+def parse_formats(spec: str) -> tuple[str, ...]:
+    formats = tuple(f.strip() for f in spec.split(",") if f.strip())
+    if not formats or any(f not in FORMATS for f in formats):
+        raise SystemExit(f"formats take {', '.join(FORMATS)}, got {spec!r}")
+    return formats
+
+
+def parse_targets(spec: str) -> list[tuple[str, str]]:
+    targets = []
+    for t in (s.strip() for s in spec.split(",") if s.strip()):
+        ep, _, level = t.partition("-")
+        if ep == "dml" or ep == "directml":
+            raise SystemExit(f"target {t!r}: DirectML compiles its partitions at session creation and "
+                             "cannot be pre-optimized offline — ship `any-basic` for DirectML sessions")
+        if ep not in EP_LEVELS or level not in EP_LEVELS[ep]:
+            allowed = ", ".join(f"{e}-{lv}" for e, lvs in EP_LEVELS.items() for lv in lvs)
+            raise SystemExit(f"unknown target {t!r} (allowed: {allowed})")
+        targets.append((ep, level))
+    return targets
+
+
+def _options(level, threads: int = 0) -> ort.SessionOptions:
+    so = ort.SessionOptions()
+    so.graph_optimization_level = level
+    so.intra_op_num_threads = threads
+    so.log_severity_level = 3
+    return so
+
+
+def artifact_path(path: str, out_dir: str, target: str, fmt: str) -> str:
+    return os.path.join(out_dir, f"{os.path.basename(path)[: -len('.onnx')]}.{target}.{fmt}")
+
+
+def write_artifact(path: str, dst: str, level: str, target: str) -> None:
+    """Let ORT optimize `path` at `level` and save the result to `dst` (`.onnx` or `.ort`)."""
+    so = _options(LEVELS[level])
+    so.optimized_model_filepath = dst
+    if dst.endswith(".ort"):
+        so.add_session_config_entry("session.save_model_format", "ORT")
+    else:
+        so.add_session_config_entry("session.optimized_model_external_initializers_file_name",
+                                    os.path.basename(dst) + "_data")
+        so.add_session_config_entry("session.optimized_model_external_initializers_min_size_in_bytes", "1024")
+    ort.InferenceSession(path, so, providers=["CPUExecutionProvider"])
+    if dst.endswith(".onnx"):
+        model = onnx.load(dst, load_external_data=False)
+        _set_meta(model, "winstt_ort_preoptimized", f"{target};ort={ort.__version__}")
+        onnx.save(model, dst)
+
+
+def parity_feeds(sess: ort.InferenceSession, rng) -> dict[str, np.ndarray]:
+    feeds = {}
+    for i in sess.get_inputs():
+        shape = [d if isinstance(d, int) else (resolve_symbol(str(d), PARITY_BINDINGS) or 1) for d in i.shape]
+        if "float" in i.type:
+            dt = np.float16 if "float16" in i.type else np.float32
+            feeds[i.name] = (rng.randn(*shape) * 0.1).astype(dt)
+        elif "bool" in i.type:
+            feeds[i.name] = np.ones(shape, dtype=bool)
+        else:  # ids, positions, write slots, lengths: 1 is in range for all of them
+            feeds[i.name] = np.ones(shape, dtype=np.int32 if "int32" in i.type else
+                                    np.int8 if "int8" in i.type else np.int64)
+    return feeds
+
+
+def check_identical(path: str, dst: str, level: str) -> float:
+    """Max |diff| over every output of raw-at-`level` vs the artifact with optimizations off (must be 0)."""
+    raw = ort.InferenceSession(path, _options(LEVELS[level]), providers=["CPUExecutionProvider"])
+    opt = ort.InferenceSession(dst, _options(ort.GraphOptimizationLevel.ORT_DISABLE_ALL),
+                               providers=["CPUExecutionProvider"])
+    feeds = parity_feeds(raw, np.random.RandomState(0))
+    worst = 0.0
+    for name, a, b in zip([o.name for o in raw.get_outputs()], raw.run(None, feeds), opt.run(None, feeds)):
+        if a.shape != b.shape:
+            raise SystemExit(f"{os.path.basename(dst)}: output {name} shape {b.shape} != raw {a.shape}")
+        if not np.array_equal(a, b):
+            worst = max(worst, float(np.abs(a.astype(np.float64) - b.astype(np.float64)).max()))
+    return worst
+
+
+def cold_start(path: str, level, repeats: int) -> tuple[float, float]:
+    """Median (session creation ms, first run ms) over `repeats` fresh sessions."""
+    create, first = [], []
+    feeds = None
+    for _ in range(repeats):
+        t0 = time.perf_counter()
+        sess = ort.InferenceSession(path, _options(level), providers=["CPUExecutionProvider"])
+        t1 = time.perf_counter()
+        feeds = feeds or parity_feeds(sess, np.random.RandomState(0))
+        sess.run(None, feeds)
+        create.append((t1 - t0) * 1e3)
+        first.append((time.perf_counter() - t1) * 1e3)
+        del sess
+    return float(np.median(create)), float(np.median(first))
+
+
+def _size(path: str) -> int:
+    return os.path.getsize(path) + (os.path.getsize(path + "_data") if os.path.exists(path + "_data") else 0)
+
+
+def preoptimize_graphs(paths: list[str], targets: list[tuple[str, str]], formats: tuple[str, ...],
+                       out_dir: str | None = None, repeats: int = 3, check: bool = True) -> bool:
+    """Write, verify and benchmark every (graph, target, format); returns False on any mismatch."""
+    ok = True
+    rows = []
+    for path in paths:
+        dst_dir = out_dir or os.path.dirname(path)
+        os.makedirs(dst_dir, exist_ok=True)
+        for ep, level in targets:
+            target = f"{ep}-{level}"
+            raw_create, raw_first = cold_start(path, LEVELS[level], repeats)
+            for fmt in formats:
+                dst = artifact_path(path, dst_dir, target, fmt)
+                write_artifact(path, dst, level, target)
+                diff = check_identical(path, dst, level) if check else 0.0
+                flag = "" if diff == 0.0 else f"  MISMATCH max|diff|={diff:.3g}"
+                ok &= not flag
+                create, first = cold_start(dst, ort.GraphOptimizationLevel.ORT_DISABLE_ALL, repeats)
+                rows.append((os.path.basename(dst), raw_create, create, raw_first, first, _size(dst), flag))
+    print(f"{'artifact':<52} {'create raw→pre (ms)':>20} {'first run raw→pre (ms)':>23} {'size':>9}")
+    for name, rc, c, rf, f, size, flag in rows:
+        print(f"{name:<52} {rc:>8.0f} → {c:>6.0f} ({c / rc:>4.0%}) {rf:>9.1f} → {f:>7.1f}   "
+              f"{size / 1e6:>6.1f} MB{' identical' if check and not flag else ''}{flag}")
+    return ok
+
+
+def graphs_in(args_paths: list[str]) -> list[str]:
+    paths = []
+    for p in args_paths:
+        found = sorted(glob.glob(os.path.join(p, "*.onnx"))) if os.path.isdir(p) else [p]
+        paths += [f for f in found if not ARTIFACT_RE.search(f)]
+    return paths
+
+
+def main() -> None:
+    ap = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    ap.add_argument("graphs", nargs="+", help="graphs or directories of graphs")
+    ap.add_argument("--targets", default="any-basic,cpu-extended",
+                    help="comma list of <ep>-<level>: any-basic, cpu-basic, cpu-extended, cpu-all "
+                         "(default any-basic,cpu-extended)")
+    ap.add_argument("--formats", default="onnx,ort", help="onnx, ort or both (default both)")
+    ap.add_argument("--out-dir", help="where artifacts go (default: next to each graph)")
+    ap.add_argument("--repeats", type=int, default=3, help="cold-start samples per graph (default 3)")
+    ap.add_argument("--no-check", action="store_true", help="skip the bit-exact output comparison")
+    args = ap.parse_args()
+    formats = parse_formats(args.formats)
+    paths = graphs_in(args.graphs)
+    if not paths:
+        raise SystemExit("no .onnx graphs found")
+    if not preoptimize_graphs(paths, parse_targets(args.targets), formats, args.out_dir, args.repeats,
+                              not args.no_check):
+        raise SystemExit("pre-optimized artifact differs from its raw graph (see MISMATCH rows)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,275 @@
+#!/usr/bin/env python3
+"""Profile emitted decoders under ORT's profiler and report per-op / per-layer hotspots, memcpy nodes
+and per-step memory traffic.
+
+WHY
+---
+After a rewrite, the only signal has been the engine's overall warm ms/token. That cannot say
+whether the cross-bias Adds, the KV-write MatMuls / ScatterNDs, or the cross attention itself now
+dominate a step. ORT already times every kernel when `enable_profiling` is on; this turns that
+trace into a report per emitted variant.
+
+WHAT
+----
+Each decoder gets its own CPU-EP session with profiling on and is driven for `steps` decode calls by
+the sweep's IOBinding runners (`cohere_decoder_sweep.StaticRunner` / `DynamicRunner`, so feed
+construction stays out of the numbers). Encoder-side inputs (`encoder_hidden_states`,
+`cross_attn.*`, `cross_bias`) get synthetic values at `enc_len` keys, or at the pinned length
+of an `_x<B>` decoder. A `_pf<S>` prefill decoder repeats one full prompt write per call. The
+first `WARMUP` calls (arena growth, first-touch) are dropped, and the steady-state calls are
+summarized per step:
+
+  * ops: kernel time per op type (calls, ms, share of kernel time), plus the hottest nodes by name;
+  * layers: kernel time per decoder layer (layer index from the graph node's name or tensors; `-` =
+    outside any layer, or a node ORT's fusions created);
+  * memcpy: `Memcpy*` nodes (a CPU-only graph has none; any here means an EP boundary);
+  * memory: built from the sizes ORT logs per kernel (`output_size`, `activation_size`,
+    `parameter_size`; the profiler records no allocator or arena counters): bytes written per step
+    (allocation churn), the largest single kernel's working set, and the per-step output growth over
+    the steady state (non-zero = buffers still grow with the decode length);
+  * run vs kernel: `model_run` wall time minus summed kernel time (executor / binding overhead).
+
+`profile.json` (every summary) and `profile.md` (one section of tables per decoder) go to the report
+dir next to the raw traces, which open in chrome://tracing / Perfetto.
+
+Wired into `cohere_decompose_attention.py --profile N` (every emitted decoder after conversion) and
+`cohere_inject_cross_bias.py --profile N` (every patched decoder).
+
+USAGE
+-----
+    python ort_profile.py <decoder.onnx> [<decoder.onnx> ...] [--steps 32] [--enc-len 375]
+        [--report-dir DIR] [--threads N] [--top 12]
+"""
+from __future__ import annotations
+
+import argparse
+import bisect
+import glob
+import json
+import os
+from collections import defaultdict
+
+import numpy as np
+import onnx
+
+from cohere_decoder_sweep import VARIANT_RE, Decoder, DynamicRunner, StaticRunner
+from graph_cost import layer_of, layer_of_name
+
+WARMUP = 2  # profiled calls dropped from the steady-state summary
+PROFILE_ENC_LEN = 375  # encoder keys of a 30 s Cohere clip (3000 mel frames / 8)
+CONTROL_FLOW = {"If", "Loop", "Scan"}  # their time is their subgraph nodes' time, which is logged too
+# Inputs the runners bind themselves; everything else is encoder-side and gets synthetic values.
+RUNNER_INPUTS = {"input_ids", "attention_mask", "position_ids", "num_logits_to_keep", "use_cache_branch",
+                 "encoder_hidden_states", "attn_bias"}
+
+
+def synthetic_feeds(dec: Decoder, enc_len: int, rng, shape_of=None) -> dict[str, np.ndarray]:
+    """Encoder-side feeds at `enc_len` keys (batch 1 — the static runner repeats them per row).
+    `shape_of(node_arg)` may return the shape of an input with an export-specific layout (or None)."""
+    ehs = dec.inputs.get("encoder_hidden_states")
+    hidden = ehs.shape[2] if ehs is not None and isinstance(ehs.shape[2], int) else dec.nh * dec.hd
+    feeds = {"encoder_hidden_states": (rng.randn(1, enc_len, hidden) * 0.1).astype(np.float32)}
+    for n, i in dec.inputs.items():
+        if n in RUNNER_INPUTS or n.startswith(("past_key_values.", "kv_")):
+            continue
+        per_row = len(i.shape) == 4 and dec.batch > 1  # (B, ...) cross tensors of a batched decoder
+        shape = (shape_of(i) if shape_of else None) or \
+            [1 if k == 0 and (per_row or not isinstance(d, int)) else (d if isinstance(d, int) else enc_len)
+             for k, d in enumerate(i.shape)]
+        dt = dec.dt[n]
+        if n == "cross_bias":
+            feeds[n] = np.zeros(shape, dtype=dt)
+        elif np.issubdtype(dt, np.floating):
+            feeds[n] = (rng.randn(*shape) * 0.1).astype(dt)
+        else:
+            feeds[n] = rng.randint(-8, 8, size=shape).astype(dt)
+    return feeds
+
+
+def _drive(dec: Decoder, feeds: dict, steps: int, rng) -> int:
+    """Run `steps` decoder calls; returns how many ran (a static decoder stops at its capacity)."""
+    vocab = dec.sess.get_outputs()[0].shape[-1]
+    ids = [int(t) for t in rng.randint(0, vocab if isinstance(vocab, int) else 100, steps + 16)]
+    if not dec.static:
+        runner = DynamicRunner(dec, feeds)
+        for j in range(steps):
+            runner.step([ids[j]])
+        return steps
+    runner = StaticRunner(dec, feeds)
+    if dec.s_q > 1:  # prefill graph: each call is one full prompt write at slot 0
+        for _ in range(steps):
+            runner.reset()
+            runner.step(ids[:dec.s_q], 0)
+        return steps
+    n = min(steps, dec.capacity())
+    for j in range(n):
+        runner.step([ids[j]], j)
+    return n
+
+
+def node_layers(path: str) -> dict[str, str]:
+    """Layer index of every node of `path` by the name the trace gives it, from the node's name or its
+    tensor names. ORT logs an unnamed node as `<op>_<index>`, its position in the main graph (an
+    unfused node keeps it through the optimizer); unnamed `If`-branch nodes stay unmapped."""
+    model = onnx.load(path, load_external_data=False)
+    out: dict[str, str] = {}
+
+    def visit(g, main: bool) -> None:
+        for k, n in enumerate(g.node):
+            if n.name or main:
+                out[n.name or f"{n.op_type}_{k}"] = layer_of(n)
+            for a in n.attribute:
+                if a.type == onnx.AttributeProto.GRAPH:
+                    visit(a.g, False)
+    visit(model.graph, True)
+    return out
+
+
+def summarize(trace_path: str, name: str, warmup: int = WARMUP, top: int = 12,
+              layers_by_node: dict[str, str] | None = None) -> dict:
+    """Steady-state per-step summary of one ORT profiler trace."""
+    with open(trace_path, encoding="utf-8") as f:
+        events = json.load(f)
+    runs = sorted((e for e in events if e.get("cat") == "Session" and e.get("name") == "model_run"),
+                  key=lambda e: e["ts"])
+    steady = runs[warmup:] or runs
+    if not steady:
+        raise SystemExit(f"{trace_path}: no model_run events — was the session run at all?")
+    t0 = steady[0]["ts"]
+    n = len(steady)
+    ops: dict[str, list] = defaultdict(lambda: [0, 0.0])
+    nodes: dict[str, list] = defaultdict(lambda: ["", 0.0])
+    layers: dict[str, float] = defaultdict(float)
+    memcpy: dict[str, float] = defaultdict(float)
+    starts = [r["ts"] for r in steady]
+    written = [0] * n  # output bytes of each steady-state call
+    kernel_us = working = 0
+    for e in events:
+        if e.get("cat") != "Node" or not e.get("name", "").endswith("_kernel_time"):
+            continue
+        a = e.get("args", {})
+        if e["ts"] < t0:
+            continue
+        node = e["name"][: -len("_kernel_time")]
+        op = a.get("op_name", "?")
+        if op in CONTROL_FLOW:
+            continue
+        dur = float(e["dur"])
+        kernel_us += dur
+        ops[op][0] += 1
+        ops[op][1] += dur
+        nodes[node][0] = op
+        nodes[node][1] += dur
+        layers[(layers_by_node or {}).get(node) or layer_of_name(node) or "-"] += dur
+        if op.startswith("Memcpy"):
+            memcpy[node] += dur
+        out_b = int(a.get("output_size", 0))
+        written[bisect.bisect_right(starts, e["ts"]) - 1] += out_b
+        working = max(working, int(a.get("activation_size", 0)) + int(a.get("parameter_size", 0)) + out_b)
+    run_ms = np.array([r["dur"] for r in steady], dtype=np.float64) / 1e3
+    k_ms = kernel_us / 1e3 / n
+    return {
+        "decoder": name, "trace": trace_path, "steps": n, "warmup": min(warmup, len(runs) - n),
+        "run_ms": {"mean": float(run_ms.mean()), "p50": float(np.percentile(run_ms, 50)),
+                   "p95": float(np.percentile(run_ms, 95))},
+        "kernel_ms": k_ms, "overhead_ms": float(run_ms.mean()) - k_ms,
+        "ops": [{"op": op, "calls": c / n, "ms": us / 1e3 / n, "share": us / kernel_us if kernel_us else 0.0}
+                for op, (c, us) in sorted(ops.items(), key=lambda kv: -kv[1][1])],
+        "nodes": [{"node": nd, "op": op, "us": us / n}
+                  for nd, (op, us) in sorted(nodes.items(), key=lambda kv: -kv[1][1])[:top]],
+        "layers": {k: v / 1e3 / n for k, v in sorted(layers.items(), key=lambda kv: (kv[0] == "-", kv[0].zfill(4)))},
+        "memcpy": {"nodes": len(memcpy), "ms": sum(memcpy.values()) / 1e3 / n},
+        "memory": {"written_per_step": sum(written) // n, "written_peak_step": max(written),
+                  "kernel_working_set_peak": working, "written_growth_steady": written[-1] - written[0]},
+    }
+
+
+def profile_decoder(path: str, report_dir: str, steps: int = 32, enc_len: int = PROFILE_ENC_LEN, threads: int = 0,
+                    top: int = 12, shape_of=None, name: str | None = None) -> dict:
+    """Profile one decoder for `steps` + WARMUP calls and return its summary (trace kept in
+    `report_dir`)."""
+    name = name or os.path.basename(path)
+    os.makedirs(report_dir, exist_ok=True)
+    dec = Decoder(path, threads, profile_prefix=os.path.join(report_dir, name[: -len(".onnx")]))
+    rng = np.random.RandomState(0)
+    ran = _drive(dec, synthetic_feeds(dec, enc_len, rng, shape_of), steps + WARMUP, rng)
+    trace = dec.sess.end_profiling()
+    s = summarize(trace, name, WARMUP if ran > WARMUP else 0, top, node_layers(path))
+    s["enc_len"] = dec.cross_len or enc_len
+    return s
+
+
+def profile_emitted(onnx_dir: str, sources: list[str], steps: int, report_dir: str, enc_len: int) -> None:
+    """Profile every decoder the converter emitted in `onnx_dir` for the source decoder file names
+    `sources` (the rewritten static one and its `_dyn` / `_cpu` / `_kv*` / `_x*` / `_pf*` / `_b*`
+    variants), then write the reports."""
+    summaries = []
+    for src in sorted(sources):
+        stem = src[: -len(".onnx")]
+        for p in sorted(glob.glob(os.path.join(onnx_dir, f"{stem}*.onnx"))):
+            if VARIANT_RE.match(os.path.basename(p)[len(stem): -len(".onnx")]):
+                s = profile_decoder(p, report_dir, steps, enc_len)
+                print_summary(s)
+                summaries.append(s)
+    write_reports(summaries, report_dir)
+
+
+def print_summary(s: dict, top_ops: int = 5) -> None:
+    ops = ", ".join(f"{o['op']} {o['share']:.0%}" for o in s["ops"][:top_ops])
+    a = s["memory"]
+    print(f"  profile {s['decoder']}: {s['run_ms']['mean']:.2f} ms/call (kernels {s['kernel_ms']:.2f}, "
+          f"overhead {s['overhead_ms']:.2f}) over {s['steps']} calls — {ops}; memcpy={s['memcpy']['nodes']}, "
+          f"written {a['written_per_step'] / 1e6:.2f} MB/step, growth {a['written_growth_steady'] / 1e6:.2f} MB")
+
+
+def write_reports(summaries: list[dict], report_dir: str) -> None:
+    """`profile.json` + `profile.md` for every summary in `report_dir`."""
+    os.makedirs(report_dir, exist_ok=True)
+    with open(os.path.join(report_dir, "profile.json"), "w", encoding="utf-8") as f:
+        json.dump(summaries, f, indent=1)
+    md = ["# ORT profile", "", "| decoder | calls | ms/call | p95 | kernels | overhead | top op | written MB/step |",
+          "|---|---:|---:|---:|---:|---:|---|---:|"]
+    for s in summaries:
+        op = s["ops"][0] if s["ops"] else {"op": "-", "share": 0.0}
+        md.append(f"| {s['decoder']} | {s['steps']} | {s['run_ms']['mean']:.3f} | {s['run_ms']['p95']:.3f} | "
+                  f"{s['kernel_ms']:.3f} | {s['overhead_ms']:.3f} | {op['op']} {op['share']:.0%} | "
+                  f"{s['memory']['written_per_step'] / 1e6:.2f} |")
+    for s in summaries:
+        a = s["memory"]
+        md += ["", f"## {s['decoder']}", "",
+               f"{s['steps']} steady-state calls after {s['warmup']} warm-up, {s['enc_len']} encoder keys; "
+               f"memcpy nodes: {s['memcpy']['nodes']} ({s['memcpy']['ms']:.3f} ms/call); kernel outputs "
+               f"{a['written_per_step'] / 1e6:.2f} MB/call (peak call {a['written_peak_step'] / 1e6:.2f} MB), "
+               f"largest kernel working set {a['kernel_working_set_peak'] / 1e6:.1f} MB, steady-state output "
+               f"growth {a['written_growth_steady'] / 1e6:.2f} MB.", "",
+               "| op | calls/step | ms/step | share |", "|---|---:|---:|---:|"]
+        md += [f"| {o['op']} | {o['calls']:.0f} | {o['ms']:.3f} | {o['share']:.1%} |" for o in s["ops"]]
+        md += ["", "| layer | ms/step |", "|---|---:|"]
+        md += [f"| {k} | {v:.3f} |" for k, v in s["layers"].items()]
+        md += ["", "| node | op | µs/step |", "|---|---|---:|"]
+        md += [f"| `{x['node']}` | {x['op']} | {x['us']:.1f} |" for x in s["nodes"]]
+    with open(os.path.join(report_dir, "profile.md"), "w", encoding="utf-8") as f:
+        f.write("\n".join(md) + "\n")
+    print(f"profile report → {os.path.join(report_dir, 'profile.md')}")
+
+
+def main() -> None:
+    ap = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    ap.add_argument("decoders", nargs="+", help="decoder graphs to profile")
+    ap.add_argument("--steps", type=int, default=32, help="steady-state decode calls per decoder (default 32)")
+    ap.add_argument("--enc-len", type=int, default=PROFILE_ENC_LEN,
+                    help=f"encoder keys for dynamic cross inputs (default {PROFILE_ENC_LEN})")
+    ap.add_argument("--report-dir", default="ort_profile", help="where traces + profile.md/json go")
+    ap.add_argument("--threads", type=int, default=0, help="ORT intra-op threads (default: ORT's choice)")
+    ap.add_argument("--top", type=int, default=12, help="hottest nodes listed per decoder (default 12)")
+    args = ap.parse_args()
+    summaries = []
+    for p in args.decoders:
+        s = profile_decoder(p, args.report_dir, args.steps, args.enc_len, args.threads, args.top)
+        print_summary(s)
+        summaries.append(s)
+    write_reports(summaries, args.report_dir)
+
+
+if __name__ == "__main__":
+    main()